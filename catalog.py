@@ -0,0 +1,282 @@
+from colorama import Fore
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+import csv
+import multiprocessing
+import os
+import sqlite3
+import time
+from shell_io import print_err
+from file_system import fresh_stat, is_real_dir
+from table import Table, default_delimiter, sniff_delimiter
+
+
+DEFAULT_CATALOG_FILE = "catalog.db"
+CATALOG_VERSION = 1
+DATA_EXTENSIONS = (".csv", ".tsv")
+
+SCAN = "scan"
+SEARCH = "search"
+
+# cells that count as missing values
+NULLS = {"", "na", "n/a", "nan", "null", "none"}
+# bytes read to guess the delimiter
+SNIFF_BYTES = 64 * 1024
+
+# search terms: col=, dtype= and file= take globs with * and ?
+SEARCH_KEYS = {"col": "columns.name", "dtype": "columns.dtype", "file": "files.path"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (version INTEGER);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    size INTEGER,
+    rows INTEGER,
+    delimiter TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS columns (
+    path TEXT REFERENCES files(path) ON DELETE CASCADE,
+    position INTEGER,
+    name TEXT,
+    dtype TEXT,
+    min,
+    max,
+    nulls INTEGER,
+    PRIMARY KEY (path, position)
+);
+CREATE INDEX IF NOT EXISTS columns_by_name ON columns (name COLLATE NOCASE);
+"""
+
+
+
+def catalog_file(memory_bank) -> str:
+    path = memory_bank.variables["settings"].get("catalog_file")
+    return path if path is not None else DEFAULT_CATALOG_FILE
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SCHEMA)
+    version = connection.execute("SELECT version FROM info").fetchone()
+    if version is None or version[0] != CATALOG_VERSION:
+        # older catalogs are rebuilt from scratch
+        connection.executescript("DELETE FROM columns; DELETE FROM files; DELETE FROM info;")
+        connection.execute("INSERT INTO info VALUES (?)", (CATALOG_VERSION,))
+        connection.commit()
+    return connection
+
+
+
+# ===========================================
+#                  INDEXING
+# ===========================================
+
+class ColumnStats:
+    """
+    Running dtype, min, max and null count of one column
+    The dtype starts as int and widens to float, then str, as values that do not fit are seen
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dtype = "int"
+        self.nulls = 0
+        self.low: Any = None
+        self.high: Any = None
+        # text extremes are kept too, in case the column turns out not to be numeric
+        self.text_low: Optional[str] = None
+        self.text_high: Optional[str] = None
+
+
+    def add(self, cell: str):
+        if cell.strip().lower() in NULLS:
+            self.nulls += 1
+            return
+
+        if self.text_low is None or cell < self.text_low:
+            self.text_low = cell
+        if self.text_high is None or cell > self.text_high:
+            self.text_high = cell
+
+        if self.dtype == "str":
+            return
+        value = None
+        if self.dtype == "int":
+            try:
+                value = int(cell)
+            except ValueError:
+                self.dtype = "float"
+        if self.dtype == "float":
+            try:
+                value = float(cell)
+            except ValueError:
+                self.dtype = "str"
+                return
+        if self.low is None or value < self.low:
+            self.low = value
+        if self.high is None or value > self.high:
+            self.high = value
+
+
+    def result(self) -> Tuple[str, str, Any, Any, int]:
+        if self.dtype == "str" or self.low is None:
+            dtype = "str" if self.text_low is not None else "empty"
+            return self.name, dtype, self.text_low, self.text_high, self.nulls
+        return self.name, self.dtype, self.low, self.high, self.nulls
+
+
+def index_file(path: str) -> Dict[str, Any]:
+    """
+    Read one csv/tsv all the way through, runs in a worker process
+    :return: rows, delimiter and the stats of each column, or the error that stopped it
+    """
+    try:
+        with open(path, "r", newline="", errors="replace") as data_file:
+            delimiter = sniff_delimiter(data_file.read(SNIFF_BYTES), default_delimiter(path))
+            data_file.seek(0)
+            reader = csv.reader(data_file, delimiter=delimiter)
+            header = next(reader, [])
+            columns = [ColumnStats(name) for name in header]
+            rows = 0
+            for row in reader:
+                rows += 1
+                for stats, cell in zip(columns, row):
+                    stats.add(cell)
+                # short rows are missing their last cells
+                for stats in columns[len(row):]:
+                    stats.nulls += 1
+        return {"rows": rows, "delimiter": delimiter, "columns": [stats.result() for stats in columns],
+                "error": None}
+    except (OSError, csv.Error, UnicodeError) as e:
+        return {"rows": None, "delimiter": None, "columns": [], "error": str(e)}
+
+
+def data_files(base):
+    """
+    Every csv/tsv under base, with its path relative to base and its stat
+    :param base: the FolderStructure, its directory index is reused
+    """
+    for relative, entry in base.index.walk(base.base):
+        directory = "~/" + relative if relative else "~"
+        if entry is None:
+            print_err("ERROR: could not read " + directory)
+        elif not is_real_dir(entry) and entry.name.lower().endswith(DATA_EXTENSIONS):
+            stat = fresh_stat(entry)
+            if stat is not None:
+                yield entry.path, directory + "/" + entry.name, stat
+
+
+def scan(memory_bank, workers: Optional[int] = None):
+    """
+    Bring the catalog up to date with the csv/tsv files under base
+    Only files that are new or whose mtime or size changed are read, on a pool of processes
+    """
+    start = time.perf_counter()
+    connection = connect(catalog_file(memory_bank))
+    try:
+        known = {path: (mtime, size) for path, mtime, size in
+                 connection.execute("SELECT path, mtime_ns, size FROM files")}
+
+        changed = []
+        seen = set()
+        for full_path, relative, stat in data_files(memory_bank.variables["base"]):
+            seen.add(relative)
+            if known.get(relative) != (stat.st_mtime_ns, stat.st_size):
+                changed.append((full_path, relative, stat))
+
+        removed = [path for path in known if path not in seen]
+        connection.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+
+        # spawned workers do not inherit the locks of this shell's threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(index_file, full_path): (relative, stat)
+                       for full_path, relative, stat in changed}
+            for future in as_completed(futures):
+                relative, stat = futures[future]
+                result = future.result()
+                if result["error"] is not None:
+                    print_err("ERROR: could not index " + relative + ": " + result["error"])
+
+                connection.execute("DELETE FROM files WHERE path = ?", (relative,))
+                connection.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                   (relative, stat.st_mtime_ns, stat.st_size, result["rows"], result["delimiter"],
+                                    result["error"]))
+                connection.executemany("INSERT INTO columns VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       [(relative, i) + column for i, column in enumerate(result["columns"])])
+                connection.commit()
+        connection.commit()
+    finally:
+        connection.close()
+
+    print(Fore.LIGHTGREEN_EX + "catalog: " + str(len(changed)) + " indexed, " + str(len(removed)) + " removed, " +
+          str(len(seen) - len(changed)) + " unchanged in " + str(round(time.perf_counter() - start, 2)) + " s" +
+          Fore.RESET)
+
+
+
+# ===========================================
+#                   SEARCH
+# ===========================================
+
+def like_pattern(glob: str) -> str:
+    escaped = glob.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%").replace("?", "_")
+
+
+def search(memory_bank, terms: List[str]):
+    """
+    Find columns in the catalog, e.g. col=quality dtype=float file=*2022*
+    :return: a table of matching columns, answered from the catalog alone
+    """
+    conditions = []
+    parameters = []
+    for term in terms:
+        key, _, value = term.partition("=")
+        if key not in SEARCH_KEYS or len(value) == 0:
+            print_err("ERROR: invalid search term " + term + ", use col=, dtype= or file=")
+            return None
+        conditions.append(SEARCH_KEYS[key] + " LIKE ? ESCAPE '\\'")
+        parameters.append(like_pattern(value))
+
+    query = "SELECT files.path, columns.name, columns.dtype, files.rows, columns.min, columns.max, columns.nulls " \
+            "FROM columns JOIN files ON files.path = columns.path"
+    if len(conditions) > 0:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY files.path, columns.position"
+
+    path = catalog_file(memory_bank)
+    if not os.path.exists(path):
+        print_err("ERROR: there is no catalog yet, run catalog scan")
+        return None
+    connection = connect(path)
+    try:
+        rows = connection.execute(query, parameters).fetchall()
+    finally:
+        connection.close()
+
+    if len(rows) == 0:
+        print_err("ERROR: no columns match")
+        return None
+    return Table(["file", "column", "dtype", "rows", "min", "max", "nulls"], rows, index=False)
+
+
+def summary(memory_bank) -> str:
+    path = catalog_file(memory_bank)
+    if not os.path.exists(path):
+        return Fore.LIGHTBLUE_EX + "no catalog yet, run catalog scan" + Fore.RESET
+    connection = connect(path)
+    try:
+        files, rows, size = connection.execute("SELECT COUNT(*), SUM(rows), SUM(size) FROM files").fetchone()
+        columns = connection.execute("SELECT COUNT(*) FROM columns").fetchone()[0]
+    finally:
+        connection.close()
+    build_string = Fore.LIGHTBLUE_EX + "CATALOG: " + path + "\n"
+    build_string += "FILES: " + str(files) + "\n"
+    build_string += "COLUMNS: " + str(columns) + "\n"
+    build_string += "ROWS: " + str(rows or 0) + "\n"
+    build_string += "BYTES: " + str(size or 0) + Fore.RESET
+    return build_string
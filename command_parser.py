@@ -0,0 +1,242 @@
+from typing import List, Dict, Optional, Callable, Any, Tuple
+from shell_io import print_err
+
+
+ESCAPE = "\\"
+QUOTES = ["'", '"']
+PIPE = "|"
+BACKGROUND = "&"
+OPERATORS = [PIPE, BACKGROUND]
+
+
+class ParseError(Exception):
+    pass
+
+
+# ===========================================
+#                 TOKENIZER
+# ===========================================
+
+def lex(line: str) -> List[tuple]:
+    """
+    Split a command line into tokens
+    Runs of whitespace separate tokens, '...' and "..." group words into one token
+    and a backslash escapes the next character (outside of single quotes).
+    An unquoted | or & is returned as its own operator token.
+    :param line: the raw command line
+    :return: list of (token, is_operator)
+    """
+    tokens = []
+    current = ""
+    in_token = False
+    quote = None
+    i = 0
+
+    while i < len(line):
+        char = line[i]
+
+        if quote is not None:
+            if char == quote:
+                quote = None
+            elif char == ESCAPE and quote == '"' and i + 1 < len(line) and line[i + 1] in ['"', ESCAPE]:
+                i += 1
+                current += line[i]
+            else:
+                current += char
+
+        elif char == ESCAPE:
+            if i + 1 >= len(line):
+                raise ParseError("ERROR: command ends with an escape character")
+            i += 1
+            current += line[i]
+            in_token = True
+
+        elif char in QUOTES:
+            quote = char
+            in_token = True
+
+        elif char.isspace() or char in OPERATORS:
+            if in_token:
+                tokens.append((current, False))
+                current = ""
+                in_token = False
+            if char in OPERATORS:
+                tokens.append((char, True))
+
+        else:
+            current += char
+            in_token = True
+
+        i += 1
+
+    if quote is not None:
+        raise ParseError("ERROR: unterminated " + quote + " in command")
+    if in_token:
+        tokens.append((current, False))
+    return tokens
+
+
+def tokenize(line: str) -> List[str]:
+    """
+    Split a single command into tokens, see lex
+    """
+    return [token for token, _ in lex(line)]
+
+
+def parse_pipeline(line: str) -> Tuple[List[List[str]], bool]:
+    """
+    Split a command line into the token lists of each command separated by |
+    :param line: the raw command line
+    :return: one list of tokens per stage (a line without pipes has a single stage),
+             and whether the line ends in & to run it in the background
+    """
+    tokens = lex(line)
+    background = len(tokens) > 0 and tokens[-1] == (BACKGROUND, True)
+    if background:
+        tokens = tokens[:-1]
+
+    stages = [[]]
+    for token, is_operator in tokens:
+        if is_operator and token == BACKGROUND:
+            raise ParseError("ERROR: " + BACKGROUND + " can only come at the end of a command")
+        elif is_operator:
+            if len(stages[-1]) == 0:
+                raise ParseError("ERROR: missing command before " + token)
+            stages.append([])
+        else:
+            stages[-1].append(token)
+
+    if len(stages) > 1 and len(stages[-1]) == 0:
+        raise ParseError("ERROR: missing command after " + PIPE)
+    return stages, background
+
+
+
+
+# ===========================================
+#            COMMAND DISPATCH TABLE
+# ===========================================
+
+class Arg:
+    """
+    Declares one argument of a subcommand
+    """
+    def __init__(self, name: str, cast: Callable = str, optional: bool = False, rest: bool = False,
+                 choices: Optional[List[str]] = None, error: Optional[str] = None):
+        """
+        :param name: keyword the value is passed to the handler as (spaces become underscores)
+        :param cast: converts the token, a ValueError means the argument is invalid
+        :param optional: the argument may be left off, the handler then gets None
+        :param rest: collect this and all remaining tokens into a list (None if there are none)
+        :param choices: the only accepted values
+        :param error: message printed when the value is invalid, {} is replaced by the token
+        """
+        self.name = name
+        self.cast = cast
+        self.optional = optional or rest
+        self.rest = rest
+        self.choices = choices
+        self.error = error
+
+    def keyword(self) -> str:
+        return self.name.replace(" ", "_").replace("-", "_")
+
+    def convert(self, token: str):
+        if self.choices is not None and token not in self.choices:
+            raise ValueError(token)
+        return self.cast(token)
+
+    def error_message(self, token: str) -> str:
+        if self.error is not None:
+            return self.error.replace("{}", token)
+        return "ERROR: " + token + " is not a valid " + self.name
+
+
+class Command:
+    """
+    A subcommand: the name of the handler method on the tool and its argument schema
+    """
+    def __init__(self, handler: str, args: Optional[List[Arg]] = None, usage: Optional[str] = None):
+        self.handler = handler
+        self.args = args if args is not None else []
+        self.usage = usage
+        self.required = len([arg for arg in self.args if not arg.optional])
+
+    def parse(self, name: str, tokens: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Validate the tokens against the schema
+        :return: the handler keyword arguments, or None after printing an error
+        """
+        if len(tokens) < self.required:
+            if self.usage is not None:
+                print_err(self.usage)
+            else:
+                print_err("ERROR: " + name + " requires " + " ".join("[" + a.name + "]" for a in self.args
+                                                                     if not a.optional))
+            return None
+
+        kwargs = dict()
+        for i, arg in enumerate(self.args):
+            if arg.rest:
+                values = tokens[i:]
+                try:
+                    kwargs[arg.keyword()] = [arg.convert(token) for token in values] if len(values) > 0 else None
+                except ValueError:
+                    print_err(arg.error_message(" ".join(values)))
+                    return None
+                return kwargs
+
+            if i >= len(tokens):
+                kwargs[arg.keyword()] = None
+                continue
+
+            try:
+                kwargs[arg.keyword()] = arg.convert(tokens[i])
+            except ValueError:
+                print_err(arg.error_message(tokens[i]))
+                return None
+
+        if len(tokens) > len(self.args):
+            print_err("ERROR: too many arguments for " + name + ": " + " ".join(tokens[len(self.args):]))
+            return None
+        return kwargs
+
+
+class CommandTable:
+    """
+    Maps the subcommands of a tool to handlers so every command is validated and
+    routed with a single dictionary lookup
+    """
+    def __init__(self, label: str, commands: Dict[str, Command], position: int = 1):
+        """
+        :param label: name of the tool used in error messages
+        :param commands: subcommand -> Command
+        :param position: index of the subcommand in the command tokens
+        """
+        self.label = label
+        self.commands = commands
+        self.position = position
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.commands
+
+    def dispatch(self, tool, command: List[str]):
+        """
+        Run a command against a tool
+        :param tool: the object the handler methods belong to
+        :param command: the full list of command tokens
+        :return: whatever the handler returns, None if there is nothing to display
+        """
+        if len(command) <= self.position:
+            return None
+
+        name = command[self.position]
+        entry = self.commands.get(name)
+        if entry is None:
+            print_err("ERROR: unknown " + self.label + " command: " + name)
+            return None
+
+        kwargs = entry.parse(name, command[self.position + 1:])
+        if kwargs is None:
+            return None
+        return getattr(tool, entry.handler)(**kwargs)
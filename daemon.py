@@ -0,0 +1,232 @@
+from colorama import Fore
+from typing import Callable
+import getpass
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import shell_io
+from shell_io import print_err
+
+
+EXIT = "exit"
+
+# only the user who started the daemon can connect unless --socket-mode allows more, e.g. 660 for a group
+DEFAULT_SOCKET_MODE = 0o600
+
+# every response ends with this byte, then the exit status of the command and a newline
+END_OF_RESPONSE = b"\x00"
+ENCODING = "utf-8"
+
+
+
+def default_socket_path() -> str:
+    return os.path.join(tempfile.gettempdir(), "gnatshell-" + getpass.getuser() + ".sock")
+
+
+def unix_sockets_supported() -> bool:
+    if not hasattr(socket, "AF_UNIX") or not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        print_err("ERROR: unix domain sockets are not supported on this system")
+        return False
+    return True
+
+
+
+# ===========================================
+#                   SERVER
+# ===========================================
+
+class SocketWriter:
+    """
+    File-like target for redirect_thread_output that streams text to a client
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text: str):
+        self.wfile.write(text.encode(ENCODING))
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self) -> bool:
+        return False
+
+
+class NoInput:
+    """
+    Stands in for stdin while serving, so a command that asks for input fails instead of
+    waiting on the daemon's own terminal
+    """
+
+    def readline(self, *args):
+        raise EOFError("interactive commands cannot run in daemon mode")
+
+    def read(self, *args):
+        raise EOFError("interactive commands cannot run in daemon mode")
+
+    def isatty(self) -> bool:
+        return False
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Runs every line a client sends against the shared memory bank, streaming back the output
+    """
+
+    def handle(self):
+        writer = SocketWriter(self.wfile)
+        for raw_line in self.rfile:
+            line = raw_line.decode(ENCODING).strip()
+            errors_before = shell_io.get_error_count()
+            try:
+                with shell_io.redirect_thread_output(writer):
+                    try:
+                        self.server.run_line(line)
+                    except SystemExit:
+                        return
+                    except Exception as e:
+                        print_err("ERROR: " + line + ": " + str(e))
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+            status = 1 if shell_io.get_error_count() > errors_before else 0
+            try:
+                self.wfile.write(END_OF_RESPONSE + str(status).encode(ENCODING) + b"\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+
+def remove_stale_socket(path: str) -> bool:
+    """
+    Delete a socket file left behind by a daemon that is no longer running
+    :return: False if another daemon is still listening on path
+    """
+    if not os.path.exists(path):
+        return True
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return False
+    except OSError:
+        os.unlink(path)
+        return True
+    finally:
+        probe.close()
+
+
+def stop_server(signum, frame):
+    raise KeyboardInterrupt()
+
+
+def serve(path: str, run_line: Callable[[str], None], mode: int = DEFAULT_SOCKET_MODE) -> int:
+    """
+    Hold the memory bank in this process and run commands sent over a unix domain socket
+    :param path: the socket file
+    :param run_line: runs one command line
+    :param mode: permissions of the socket file, which decide who can connect
+    :return: exit code
+    """
+    if not unix_sockets_supported():
+        return 2
+    if not remove_stale_socket(path):
+        print_err("ERROR: a gnatshell daemon is already listening on " + path)
+        return 2
+
+    shell_io.install_output_router()
+    server = socketserver.ThreadingUnixStreamServer(path, CommandHandler)
+    server.daemon_threads = True
+    server.run_line = run_line
+    os.chmod(path, mode)
+    sys.stdin = NoInput()
+
+    # shut down cleanly on kill as well as ctrl-c so the socket file is removed
+    signal.signal(signal.SIGTERM, stop_server)
+    print(Fore.LIGHTGREEN_EX + "gnatshell daemon listening on " + path + Fore.RESET)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+
+
+# ===========================================
+#                   CLIENT
+# ===========================================
+
+class Client:
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.rfile = self.sock.makefile("rb")
+
+
+    def send(self, line: str) -> int:
+        """
+        Send one command and stream its output to stdout as it arrives
+        :return: the exit status of the command, 1 if the daemon hung up
+        """
+        self.sock.sendall(line.strip().encode(ENCODING) + b"\n")
+        for raw_line in self.rfile:
+            if raw_line.startswith(END_OF_RESPONSE):
+                return int(raw_line[len(END_OF_RESPONSE):].strip() or b"0")
+            sys.stdout.write(raw_line.decode(ENCODING))
+            sys.stdout.flush()
+        return 1
+
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def connect(path: str, lines, stop_on_error: bool = False, prompt: Callable[[], None] = None) -> int:
+    """
+    Send command lines to a running daemon
+    :param path: the socket file
+    :param lines: iterable of command lines
+    :param stop_on_error: stop at the first command that fails
+    :param prompt: called before reading each line when running interactively
+    :return: exit code, 0 if every command succeeded
+    """
+    if not unix_sockets_supported():
+        return 2
+    try:
+        client = Client(path)
+    except OSError:
+        print_err("ERROR: no gnatshell daemon is listening on " + path)
+        return 2
+
+    failed = False
+    try:
+        while True:
+            if prompt is not None:
+                prompt()
+            line = next(lines, None)
+            if line is None:
+                break
+            line = line.strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+            # exit ends this client, not the daemon
+            if line == EXIT:
+                break
+
+            status = client.send(line)
+            if status != 0:
+                failed = True
+                if stop_on_error:
+                    break
+    finally:
+        client.close()
+    return 1 if failed else 0
@@ -1,10 +1,30 @@
-from cryptography.fernet import Fernet
+import array
+import copy
+import itertools
+import json
+import mmap
+import os
 import pickle
-from typing import Optional, List, Dict, Any
-from collections import OrderedDict
-from tabulate import tabulate
-import pandas as pd
+import threading
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple, TYPE_CHECKING
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from colorama import Fore
+from command_parser import CommandTable, Command, Arg
+from shell_io import print_err
+from search_index import SearchIndex
+from table import Table
+import memo
+
+try:
+    import fcntl
+except ImportError:
+    # not available on windows, datafiles are then not locked between processes
+    fcntl = None
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
 
 VALUE_START = "> "
 VALUE_DELIMETER = "::"
@@ -15,9 +35,67 @@ FLOAT_TAG = " [float] "
 ENCRYPTED_TAG = " [encrypted] "
 
 
+# decrypted values kept in memory at once, older ones are decrypted again when needed
+DECRYPT_CACHE_SIZE = 64
+
+# saved changes are appended here and merged on load until the file is compacted
+JOURNAL_SUFFIX = ".journal"
+ADD_RECORD = "add"
+DELETE_RECORD = "del"
+# journal records allowed to build up before save compacts the file
+COMPACT_THRESHOLD = 200
+
+COMPACT = "compact"
+FIND = "find"
+
+# processes take a shared lock on this file to read the datafile and an exclusive one to write it
+LOCK_SUFFIX = ".lock"
+
+# parsed entries are pickled here, keyed on the file's path, inode, mtime and size and on PARSER_VERSION
+CACHE_SUFFIX = ".cache"
+# bump whenever parsing or DatafileValue changes so older caches are ignored
+PARSER_VERSION = 1
+
+# arrays are stored as 64 bit signed ints and doubles
+ARRAY_TYPECODES = {"array[int]": "q", "array[float]": "d"}
+ARRAY_SEPARATOR = ", "
+# a value of @file.bin keeps the array as raw native-endian values in file.bin next to the datafile
+SIDECAR_PREFIX = "@"
+# values shown when an array is displayed
+ARRAY_PREVIEW = 8
+
+# bulk encryption and decryption work on batches of entries spread over a thread pool
+CRYPTO_BATCH = 512
+CRYPTO_WORKERS = os.cpu_count() or 4
+
+
+
+def parallel_batches(function: Callable[[list], list], items: Iterable, batch_size: int = CRYPTO_BATCH,
+                     workers: int = CRYPTO_WORKERS):
+    """
+    Run function over batches of items on a thread pool, yielding the results in order
+    Only a few batches are in flight at a time, so items can be a stream
+    """
+    items = iter(items)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(itertools.islice(items, batch_size))
+            if len(batch) == 0:
+                break
+            in_flight.append(executor.submit(function, batch))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while len(in_flight) > 0:
+            yield from in_flight.popleft().result()
+
+
+
 class DatafileValue:
     """
     Represents a single entry in a Datafile.
+    Encrypted entries loaded from disk only remember where their value is in the file,
+    the ciphertext is read and decrypted the first time the value is asked for.
     """
     def __init__(self):
         self.info: str = ""
@@ -26,6 +104,9 @@ class DatafileValue:
         self.encrypted_value: Optional[str] = None
         self.tag: Optional[str] = None
         self.value = None
+        self.offset: Optional[int] = None
+        self.length: int = 0
+        self.sidecar: Optional[str] = None
 
 
 class Datafile:
@@ -36,24 +117,219 @@ class Datafile:
     def __init__(self, filepath: str, key: Optional[str] = None):
         self.filepath = filepath
         self.values: Dict[str, DatafileValue] = OrderedDict()
-
-        file = open(filepath, "r")
-        lines = file.readlines()
-
-
-        # if there is a key, initialize the cryptographer
-        self.cryptographer: Optional[Fernet] = None
-        if key is not None:
+        self.decrypted: Dict[str, str] = OrderedDict()
+        self.file = None
+        self.lock = threading.RLock()
+        self.lock_file = None
+        self.stamp: tuple = ()
+        self.journal_path = filepath + JOURNAL_SUFFIX
+        self.journal_records = 0
+        self.pending: List[Dict[str, Any]] = []
+        self.index: Optional[SearchIndex] = None
+        self.index_version = None
+        # bumped by memo.touch whenever the entries change
+        self.version = 0
+
+
+        self.key_path = key
+        self.cryptographer: Optional["Fernet"] = None
+        self.load()
+
+
+    def load_key(self):
+        """
+        if there is a key, initialize the cryptographer
+        """
+        if self.key_path is not None:
             try:
-                keyfile = open(key, "rb")
+                keyfile = open(self.key_path, "rb")
                 self.cryptographer = pickle.load(keyfile)
+                keyfile.close()
             except:
                 print("could not load key")
 
 
-        # Iterate through all the lines
+    @contextmanager
+    def locked(self, exclusive: bool = False):
+        """
+        Hold the datafile's lock file: shared for reading, exclusive for writing
+        Nested calls reuse the lock already held, so the outermost call decides whether it is exclusive
+        """
+        with self.lock:
+            if fcntl is None or self.lock_file is not None:
+                yield
+                return
+
+            self.lock_file = open(self.filepath + LOCK_SUFFIX, "a")
+            try:
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                yield
+            finally:
+                fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+                self.lock_file.close()
+                self.lock_file = None
+
+
+    def load(self):
+        """
+        Load the file from its parse cache if the file is unchanged since it was cached, otherwise parse it,
+        then merge in the journal
+        The file stays open so offsets of encrypted values always point into the version that was loaded,
+        even after another process replaces it
+        """
+        with self.locked():
+            self.values = OrderedDict()
+            self.decrypted = OrderedDict()
+
+            self.load_key()
+            self.file = open(self.filepath, "rb")
+            key = self.cache_key()
+            cached = self.read_cache(key)
+            if cached is not None:
+                self.values = cached
+                # mapped arrays are not cached, map them again
+                for entry in self.values.values():
+                    if entry.sidecar is not None:
+                        self.parse_array(entry, SIDECAR_PREFIX + entry.sidecar)
+            else:
+                self.parse()
+                self.write_cache(key)
+            self.replay()
+            self.stamp = self.disk_stamp()
+
+
+    def disk_stamp(self) -> tuple:
+        """
+        Identifies the current state of the file and its journal on disk
+        """
+        stamp = []
+        for path in [self.filepath, self.journal_path, self.key_path]:
+            if path is None:
+                continue
+            try:
+                stat = os.stat(path)
+                stamp.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+
+    def changed_on_disk(self) -> bool:
+        return self.disk_stamp() != self.stamp
+
+
+    def refresh(self) -> List[str]:
+        """
+        Reload the file if another process changed it since it was loaded or saved
+        :return: the names of the entries that changed
+        """
+        with self.locked():
+            if self.changed_on_disk():
+                return self.reload()
+        return []
+
+
+    def signature(self, entry: DatafileValue) -> tuple:
+        if entry.is_encrypted:
+            return entry.tag, entry.offset, entry.length, entry.encrypted_value
+        return entry.tag, self.text_of(entry)
+
+
+    def reload(self) -> List[str]:
+        """
+        Load the file again after something else changed it, keeping any unsaved changes
+        :return: the names of the entries that were added, changed or removed
+        """
+        with self.locked():
+            old = {name: self.signature(entry) for name, entry in self.values.items()}
+            pending = self.pending
+            old_stamp = self.stamp
+            old_cryptographer = self.cryptographer
+            self.close()
+            self.load()
+            # another process rotated the key, unsaved values were encrypted under the old one
+            if self.key_path is not None and old_stamp[-1:] != self.stamp[-1:]:
+                self.reencrypt(pending, old_cryptographer)
+            for record in pending:
+                self.apply(record)
+            self.pending = pending
+
+            new = {name: self.signature(entry) for name, entry in self.values.items()}
+            changed = [name for name in new if old.get(name) != new[name]]
+            changed += [name for name in old if name not in new]
+            if len(changed) > 0:
+                memo.touch(self)
+            return changed
+
+
+    def reencrypt(self, records: List[Dict[str, Any]], old: Optional["Fernet"]):
+        """
+        Encrypt the values of unsaved records again under the current key
+        :param old: the key they were encrypted under
+        """
+        from cryptography.fernet import InvalidToken
+
+        if old is None or self.cryptographer is None:
+            return
+        for record in records:
+            if record["op"] != ADD_RECORD or not record.get("encrypted"):
+                continue
+            try:
+                record["value"] = self.cryptographer.encrypt(old.decrypt(bytes.fromhex(record["value"]))).hex()
+            except (InvalidToken, ValueError):
+                print_err("ERROR: unsaved value " + record["name"] + " could not be encrypted under the new key")
+
+
+    def cache_key(self) -> tuple:
+        stat = os.fstat(self.file.fileno())
+        return PARSER_VERSION, os.path.abspath(self.filepath), stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+    def read_cache(self, key: tuple) -> Optional[Dict[str, DatafileValue]]:
+        try:
+            with open(self.filepath + CACHE_SUFFIX, "rb") as cache_file:
+                cached_key, values = pickle.load(cache_file)
+        except Exception:
+            return None
+        return values if cached_key == key else None
+
+
+    def write_cache(self, key: tuple):
+        """
+        Pickle the parsed entries next to the file, encrypted values are cached as offsets only
+        """
+        values = OrderedDict()
+        for name, entry in self.values.items():
+            if entry.sidecar is not None:
+                entry = copy.copy(entry)
+                entry.value = None
+            values[name] = entry
+
+        # several processes may be loading the file at once
+        temp_path = self.filepath + CACHE_SUFFIX + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(temp_path, "wb") as cache_file:
+                pickle.dump((key, values), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.filepath + CACHE_SUFFIX)
+        except (OSError, pickle.PicklingError):
+            # the cache is only an optimisation, e.g. the folder may be read only
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+    def parse(self):
+        """
+        Index the file: plain values are parsed, encrypted values are only located
+        """
+        file = self.file
+
+        # Iterate through all the lines, keeping track of where each one starts
         current_val = DatafileValue()
-        for line in lines:
+        position = 0
+        for raw_line in file:
+            line_start = position
+            position += len(raw_line)
+            line = raw_line.decode()
 
             # If this is a data line, then store the value
             if line.startswith(VALUE_START) and VALUE_DELIMETER in line:
@@ -79,18 +355,19 @@ class Datafile:
                         print("Error, " + current_val.name + " is not a float.")
                         current_val.value = None
 
-                # get encrypted string
+                # Parse value into a typed array
+                elif INT_ARRAY_TAG in split[0] or FLOAT_ARRAY_TAG in split[0]:
+                    current_val.tag = "array[int]" if INT_ARRAY_TAG in split[0] else "array[float]"
+                    self.parse_array(current_val, split[1].strip())
+
+                # remember where the encrypted string is
                 elif ENCRYPTED_TAG in split[0]:
-                    if self.cryptographer is not None:
-                        current_val.encrypted_value = split[1].strip()
-                        current_val.value = self.cryptographer.decrypt(bytes.fromhex(split[1].strip())).decode()
-                        current_val.is_encrypted = True
-                        current_val.tag = "encrypted"
-                    else:
-                        current_val.encrypted_value = split[1].strip()
-                        current_val.value = split[1].strip()
-                        current_val.is_encrypted = True
-                        current_val.tag = "encrypted"
+                    value_start = raw_line.index(VALUE_DELIMETER.encode()) + len(VALUE_DELIMETER)
+                    value_bytes = raw_line[value_start:]
+                    current_val.offset = line_start + value_start + (len(value_bytes) - len(value_bytes.lstrip()))
+                    current_val.length = len(value_bytes.strip())
+                    current_val.is_encrypted = True
+                    current_val.tag = "encrypted"
 
                 # Store value as string
                 else:
@@ -104,31 +381,191 @@ class Datafile:
             elif len(line) > 1:
                 current_val.info += line
 
-        file.close()
 
+    def parse_array(self, entry: DatafileValue, text: str):
+        """
+        Fill in an array entry from its text: comma separated values, or @file for a binary sidecar.
+        Sidecars are memory-mapped, so their values are a read-only memoryview rather than an array.array
+        """
+        typecode = ARRAY_TYPECODES[entry.tag]
+        try:
+            if text.startswith(SIDECAR_PREFIX):
+                entry.sidecar = text[len(SIDECAR_PREFIX):]
+                entry.value = self.map_sidecar(entry.sidecar, typecode)
+            else:
+                cast = int if typecode == "q" else float
+                entry.value = array.array(typecode, map(cast, text.replace(",", " ").split()))
+        except (ValueError, OverflowError, OSError):
+            print("Error, " + entry.name + " is not an " + entry.tag + ".")
+            entry.value = None
+
+
+    def sidecar_path(self, sidecar: str) -> str:
+        return os.path.join(os.path.dirname(self.filepath), sidecar)
+
+
+    def map_sidecar(self, sidecar: str, typecode: str):
+        with open(self.sidecar_path(sidecar), "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size == 0:
+                return array.array(typecode)
+            if size % array.array(typecode).itemsize != 0:
+                raise ValueError(sidecar + " does not hold a whole number of values")
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)
 
 
+    def write_sidecar(self, sidecar: str, values, typecode: str):
+        path = self.sidecar_path(sidecar)
+        with open(path + ".tmp", "wb") as file:
+            file.write(array.array(typecode, values).tobytes())
+        os.replace(path + ".tmp", path)
 
-    def view(self, vars=None) -> str:
+
+    def text_of(self, entry: DatafileValue) -> str:
         """
-        View all items in the datafile in a table
-        :return: a string displaying a table of all entries in the table
+        How an unencrypted value is written to the file
         """
-        names = []
-        values = []
-        tags = []
-        for name in self.values.keys():
-            names.append(name)
+        # the pointer is kept even when the sidecar could not be read
+        if entry.sidecar is not None:
+            return SIDECAR_PREFIX + entry.sidecar
+        if entry.tag in ARRAY_TYPECODES and entry.value is not None:
+            return ARRAY_SEPARATOR.join(str(item) for item in entry.value)
+        return str(entry.value)
 
-            values.append(str(self.values[name].value))
 
-            if self.values[name].tag is not None:
-                tags.append(self.values[name].tag)
-            else:
-                tags.append(" ")
+    def display_value(self, entry: DatafileValue) -> str:
+        value = self.value_of(entry)
+        if entry.tag in ARRAY_TYPECODES and value is not None:
+            build_string = ARRAY_SEPARATOR.join(str(item) for item in value[:ARRAY_PREVIEW])
+            if len(value) > ARRAY_PREVIEW:
+                build_string += ", ... (" + str(len(value)) + " values)"
+            return "[" + build_string + "]"
+        return str(value)
+
+
+    def replay(self):
+        """
+        Merge the changes saved to the journal since the file was last compacted
+        """
+        self.journal_records = 0
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "r") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a save that was cut off part way through a record
+                    continue
+                self.apply(record)
+                self.journal_records += 1
+
+
+    def apply(self, record: Dict[str, Any]):
+        if record["op"] == DELETE_RECORD:
+            self.values.pop(record["name"], None)
+            self.decrypted.pop(record["name"], None)
+            return
+
+        entry = DatafileValue()
+        entry.name = record["name"]
+        entry.info = record.get("info")
+        entry.tag = record.get("tag")
+        entry.is_encrypted = record.get("encrypted", False)
+        if entry.is_encrypted:
+            entry.encrypted_value = record["value"]
+        elif entry.tag in ARRAY_TYPECODES:
+            self.parse_array(entry, record["value"])
+        else:
+            entry.value = record["value"]
+        self.values[entry.name] = entry
+        self.decrypted.pop(entry.name, None)
+
+
+    def encrypted_text(self, entry: DatafileValue) -> str:
+        """
+        The ciphertext of an encrypted entry, read from the file the first time it is needed
+        """
+        with self.lock:
+            if entry.encrypted_value is None and entry.offset is not None:
+                if self.file is None:
+                    self.file = open(self.filepath, "rb")
+                    stat = os.fstat(self.file.fileno())
+                    # the offsets belong to a version of the file that has since been replaced
+                    if (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self.stamp[0]:
+                        self.reload()
+                        entry = self.values.get(entry.name, entry)
+                        if entry.encrypted_value is not None or entry.offset is None:
+                            return entry.encrypted_value
+                self.file.seek(entry.offset)
+                entry.encrypted_value = self.file.read(entry.length).decode()
+            return entry.encrypted_value
+
+
+    def value_of(self, entry: DatafileValue):
+        """
+        The value of an entry, decrypting it if needed
+        """
+        if not entry.is_encrypted:
+            return entry.value
+        if self.cryptographer is None:
+            return self.encrypted_text(entry)
+
+        from cryptography.fernet import InvalidToken
+        with self.lock:
+            if entry.name in self.decrypted:
+                self.decrypted.move_to_end(entry.name)
+                return self.decrypted[entry.name]
+
+            try:
+                value = self.decrypt(entry)
+            except (InvalidToken, ValueError):
+                print_err("ERROR: " + entry.name + " cannot be decrypted with the current key")
+                return None
+            self.remember(entry.name, value)
+            return value
+
+
+    def decrypt(self, entry: DatafileValue) -> str:
+        return self.cryptographer.decrypt(bytes.fromhex(self.encrypted_text(entry))).decode()
+
+
+    def remember(self, name: str, value: str):
+        with self.lock:
+            self.decrypted[name] = value
+            self.decrypted.move_to_end(name)
+            while len(self.decrypted) > DECRYPT_CACHE_SIZE:
+                self.decrypted.popitem(last=False)
+
+
+    def close(self):
+        """
+        Forget every decrypted value and release the file
+        """
+        with self.lock:
+            self.decrypted.clear()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
 
-        df = pd.DataFrame({'name': names, 'value': values, 'tag': tags})
-        return tabulate(df, headers='keys', tablefmt='fancy_grid')
+
+
+    def view(self, vars=None) -> Table:
+        """
+        View all items in the datafile in a table
+        :return: a table of all entries in the datafile
+        """
+        rows = []
+        self.refresh()
+        with self.lock:
+            for name in self.values.keys():
+                tag = self.values[name].tag if self.values[name].tag is not None else " "
+                rows.append([name, self.display_value(self.values[name]), tag])
+
+        return Table(["name", "value", "tag"], rows)
 
 
 
@@ -139,36 +576,45 @@ class Datafile:
         :param name: the key for the datafile
         :return: a display of the info, key, and value alongside any tags for this item
         """
-        build_string = ""
-        if name not in self.values.keys():
-            build_string += "NO ENTRY"
+        self.refresh()
+        with self.lock:
+            build_string = ""
+            if name not in self.values.keys():
+                build_string += "NO ENTRY"
+                return build_string
+            if self.values[name].info is not None:
+                build_string += self.values[name].info + "\n"
+            if self.values[name].is_encrypted:
+                build_string += "[encrypted]\n"
+            build_string += self.values[name].name + ": " + self.display_value(self.values[name])
             return build_string
-        if self.values[name].info is not None:
-            build_string += self.values[name].info + "\n"
-        if self.values[name].is_encrypted:
-            build_string += "[encrypted]\n"
-        build_string += self.values[name].name + ": " + str(self.values[name].value)
-        return build_string
 
 
     def get(self, name:str) -> Optional[Any]:
         """
         Get the value of one item in the datafile by name
         """
-        if name not in self.values.keys():
-            return None
-        return self.values[name].value
+        with self.lock:
+            if name not in self.values.keys():
+                return None
+            return self.value_of(self.values[name])
 
 
-    def add(self, name:str, value, is_encrypted:bool = False, info:Optional[str] = None, tag:Optional[str] = None):
+    def add(self, name:str, value, is_encrypted:bool = False, info:Optional[str] = None, tag:Optional[str] = None,
+            sidecar:Optional[str] = None):
         """
         Add a new item to the datafile
         :param name: the key
         :param value: the value
         :param is_encrypted: whether or not to encrypt it
         :param info: any info about it
-        :param tag: an optional tag: int, float, etc
+        :param tag: an optional tag: int, float, array[int], array[float], etc
+        :param sidecar: for arrays, a file next to the datafile to store the values in as binary
         """
+        if is_encrypted and self.cryptographer is None:
+            print_err("ERROR: " + self.filepath + " has no key, " + name + " was not added")
+            return
+
         new_data = DatafileValue()
         new_data.name = name
         new_data.value = value
@@ -176,14 +622,107 @@ class Datafile:
         new_data.info = info
         new_data.tag = tag
 
-        if new_data.is_encrypted and self.cryptographer is not None:
+        if new_data.is_encrypted:
             new_data.encrypted_value = self.cryptographer.encrypt(new_data.value.encode()).hex()
+            new_data.value = None
+            self.remember(name, value)
+        elif tag in ARRAY_TYPECODES:
+            new_data.value = array.array(ARRAY_TYPECODES[tag], value)
+            if sidecar is not None:
+                self.write_sidecar(sidecar, new_data.value, ARRAY_TYPECODES[tag])
+                new_data.sidecar = sidecar
+                new_data.value = self.map_sidecar(sidecar, ARRAY_TYPECODES[tag])
 
         self.values[new_data.name] = new_data
+        self.pending.append({"op": ADD_RECORD, "name": name, "info": info, "tag": tag, "encrypted": is_encrypted,
+                             "value": new_data.encrypted_value if is_encrypted else
+                             self.text_of(new_data) if tag in ARRAY_TYPECODES else value})
+        memo.touch(self)
         print(Fore.LIGHTGREEN_EX + " + " + new_data.name)
 
 
 
+    def add_many(self, rows: Iterable[Tuple[str, Any, Optional[str]]], is_encrypted: bool = False,
+                 tag: Optional[str] = None) -> Optional[int]:
+        """
+        Add many items at once, encrypting them in parallel batches
+        Unlike add, nothing is printed for each item
+        :param rows: (name, value, info) for every item
+        :param is_encrypted: whether or not to encrypt them
+        :param tag: an optional tag for all of them
+        :return: the number of items added, None if they could not be encrypted
+        """
+        if is_encrypted and self.cryptographer is None:
+            print_err("ERROR: " + self.filepath + " has no key, nothing was added")
+            return None
+
+        def encrypt(batch):
+            return [(name, value, info, self.cryptographer.encrypt(value.encode()).hex())
+                    for name, value, info in batch]
+
+        if is_encrypted:
+            results = parallel_batches(encrypt, rows)
+        else:
+            results = ((name, value, info, value) for name, value, info in rows)
+
+        count = 0
+        with self.lock:
+            for name, value, info, encrypted_value in results:
+                entry = DatafileValue()
+                entry.name = name
+                entry.info = info
+                entry.tag = tag
+                entry.is_encrypted = is_encrypted
+                if is_encrypted:
+                    entry.encrypted_value = encrypted_value
+                else:
+                    entry.value = value
+
+                self.values[name] = entry
+                self.decrypted.pop(name, None)
+                self.pending.append({"op": ADD_RECORD, "name": name, "info": info, "tag": tag,
+                                     "encrypted": is_encrypted, "value": encrypted_value if is_encrypted else value})
+                count += 1
+            memo.touch(self)
+        return count
+
+
+    def items(self):
+        """
+        Yield (name, value, info) for every item, decrypting in parallel batches
+        Values decrypted here are not kept in the decrypted value cache
+        """
+        def decrypt(batch):
+            return [(entry.name, self.decrypt(entry) if entry.is_encrypted and self.cryptographer is not None
+                     else self.value_of(entry), entry.info) for entry in batch]
+
+        self.refresh()
+        with self.lock:
+            entries = list(self.values.values())
+        yield from parallel_batches(decrypt, entries)
+
+
+    def find(self, pattern: str):
+        """
+        Find items whose name or info match pattern, best matches first
+        The search index is built the first time and again after the datafile changes
+        :return: a line for each match with the name and the first line of its info
+        """
+        self.refresh()
+        with self.lock:
+            if self.index is None or self.index_version != self.version:
+                self.index = SearchIndex((name, entry.info) for name, entry in self.values.items())
+                self.index_version = self.version
+            index = self.index
+            matches = [(name, self.values[name].info) for name in index.search(pattern) if name in self.values]
+
+        if len(matches) == 0:
+            print_err("ERROR: nothing matches " + pattern)
+        for name, info in matches:
+            info_lines = (info or "").strip().split("\n")
+            yield Fore.LIGHTGREEN_EX + name + "  " + Fore.LIGHTBLACK_EX + info_lines[0] + Fore.RESET
+
+
     def delete(self, name: str):
         """
         Delete an item by name
@@ -191,32 +730,160 @@ class Datafile:
         """
         if name in self.values.keys():
             del self.values[name]
+            self.decrypted.pop(name, None)
+            self.pending.append({"op": DELETE_RECORD, "name": name})
+            memo.touch(self)
             print(Fore.LIGHTRED_EX + " - " + name)
 
 
 
     def save(self):
         """
-        Save the datafile by writing to its .txt
+        Save the changes made since the last save by appending them to the journal
+        The whole file is only rewritten once the journal passes COMPACT_THRESHOLD records
         """
-        file = open(self.filepath, "w")
-
-        for name in self.values.keys():
-            if self.values[name].info is not None:
-                file.write(self.values[name].info.rstrip() + "\n")
-            buildstr = "> "
-            if self.values[name].tag is not None:
-                buildstr += "[" + self.values[name].tag + "] "
-            buildstr += name + ":: "
-            if self.values[name].is_encrypted:
-                buildstr += str(self.values[name].encrypted_value)
+        with self.locked(exclusive=True):
+            # merge in what other processes saved first, so the journal order matches what this process saw
+            self.refresh()
+            if len(self.pending) > 0:
+                self.trim_journal()
+                with open(self.journal_path, "a") as journal:
+                    journal.write("".join(json.dumps(record) + "\n" for record in self.pending))
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                self.journal_records += len(self.pending)
+                self.pending = []
+
+            if self.journal_records > COMPACT_THRESHOLD:
+                self.compact()
             else:
-                buildstr += str(self.values[name].value)
+                self.stamp = self.disk_stamp()
+                print(Fore.LIGHTGREEN_EX + self.filepath + " saved")
 
-            file.write(buildstr + "\n\n")
 
-        file.close()
-        print(Fore.LIGHTGREEN_EX + self.filepath + " saved")
+    def trim_journal(self):
+        """
+        Cut off a record left half written by an interrupted save, so the next record starts on its own line
+        """
+        try:
+            with open(self.journal_path, "rb+") as journal:
+                size = journal.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                journal.seek(size - 1)
+                if journal.read(1) == b"\n":
+                    return
+                journal.seek(0)
+                journal.truncate(journal.read().rfind(b"\n") + 1)
+        except FileNotFoundError:
+            return
+
+
+    def write_key(self, cryptographer):
+        """
+        Replace the key file with a pickled cryptographer, only readable by the owner
+        """
+        temp_path = self.key_path + ".tmp"
+        descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(descriptor, "wb") as keyfile:
+            pickle.dump(cryptographer, keyfile)
+            keyfile.flush()
+            os.fsync(keyfile.fileno())
+        os.replace(temp_path, self.key_path)
+        # this process wrote the new key, it is not a change to reload for
+        self.stamp = self.disk_stamp()
+
+
+    def rotate_key(self) -> Optional[int]:
+        """
+        Re-encrypt every encrypted item under a new key and retire the old one
+        While the file is rewritten the key file holds a MultiFernet of the new and old keys,
+        so whichever version of the file is on disk after a crash can still be read
+        :return: the number of items re-encrypted, None if the rotation failed
+        """
+        from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+
+        if self.cryptographer is None or self.key_path is None:
+            print_err("ERROR: " + self.filepath + " has no key to rotate")
+            return None
+
+        with self.locked(exclusive=True):
+            self.refresh()
+            old = self.cryptographer
+            new = Fernet(Fernet.generate_key())
+            # a MultiFernet left by an interrupted rotation is unpacked, MultiFernet cannot nest
+            rotator = MultiFernet([new] + (old._fernets if isinstance(old, MultiFernet) else [old]))
+            self.write_key(rotator)
+
+            def rotate(batch):
+                return [(entry, rotator.rotate(bytes.fromhex(text)).hex()) for entry, text in batch]
+
+            entries = [entry for entry in self.values.values() if entry.is_encrypted]
+            # the workers must not wait on the lock held here, so the ciphertexts are read by this thread
+            entries = ((entry, self.encrypted_text(entry)) for entry in entries)
+            try:
+                tokens = list(parallel_batches(rotate, entries))
+            except (InvalidToken, ValueError):
+                self.write_key(old)
+                print_err("ERROR: " + self.filepath + " has values the current key cannot decrypt, key not rotated")
+                return None
+
+            for entry, token in tokens:
+                entry.encrypted_value = token
+                entry.offset = None
+            self.cryptographer = rotator
+            self.compact()
+
+            self.write_key(new)
+            self.cryptographer = new
+            return len(tokens)
+
+
+    def compact(self):
+        """
+        Rewrite the datafile with every saved change merged in and empty the journal
+        The new file is written next to the old one and renamed over it, so a crash leaves one or the other
+        """
+        with self.locked(exclusive=True):
+            # entries other processes saved since this one loaded must not be dropped
+            self.refresh()
+            # read every ciphertext that is still only indexed before the file is replaced
+            for entry in self.values.values():
+                if entry.is_encrypted:
+                    self.encrypted_text(entry)
+            self.close()
+
+            temp_path = self.filepath + ".tmp"
+            file = open(temp_path, "w")
+
+            for name in self.values.keys():
+                if self.values[name].info is not None:
+                    file.write(self.values[name].info.rstrip() + "\n")
+                buildstr = "> "
+                if self.values[name].tag is not None:
+                    buildstr += "[" + self.values[name].tag + "] "
+                buildstr += name + ":: "
+                if self.values[name].is_encrypted:
+                    buildstr += str(self.values[name].encrypted_value)
+                else:
+                    buildstr += self.text_of(self.values[name])
+
+                file.write(buildstr + "\n\n")
+
+            file.flush()
+            os.fsync(file.fileno())
+            file.close()
+            os.replace(temp_path, self.filepath)
+
+            # replaying the journal over the new file changes nothing, so a crash before this is harmless
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self.journal_records = 0
+            self.pending = []
+            for entry in self.values.values():
+                entry.offset = None
+            self.stamp = self.disk_stamp()
+            print(Fore.LIGHTGREEN_EX + self.filepath + " compacted")
 
 
     def type_string(self) -> str:
@@ -224,5 +891,12 @@ class Datafile:
 
 
     def handle(self, command:list):
-        pass
+        return COMMANDS.dispatch(self, command)
+
+
+
+COMMANDS = CommandTable("datafile", {
+    COMPACT: Command("compact"),
+    FIND: Command("find", [Arg("pattern")], usage="ERROR: invalid find, must have a pattern"),
+})
 
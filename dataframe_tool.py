@@ -1,6 +1,9 @@
 from colorama import init, Fore, Back, Style
 import pandas as pd
 import matplotlib.pyplot as plt
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
+from memo import memoized
 
 
 STATS = "stats"
@@ -13,11 +16,10 @@ VIEW = "v"
 GRAPH = "graph"
 HELP = "help"
 
+# rows formatted at a time when streaming a column
+SERIES_CHUNK = 500
 
 
-# used to print error messages
-def print_err(text):
-    print(Fore.RED + text)
 
 
 
@@ -93,6 +95,40 @@ def get_series_stats(column: pd.Series, settings) -> str:
 
 
 
+class SeriesLines:
+    """
+    The lines of a printed series, formatted only when they are read
+    Iterating streams a chunk of rows at a time, get_lines formats just the rows asked for
+    so a pager can jump anywhere in a column of millions of rows
+    """
+
+    def __init__(self, column: pd.Series, chunk: int = SERIES_CHUNK):
+        self.column = column
+        self.chunk = chunk
+
+    def __len__(self) -> int:
+        # every row plus the footer
+        return len(self.column) + 1
+
+    def footer(self) -> str:
+        return "Name: " + str(self.column.name) + ", Length: " + str(len(self.column)) + \
+               ", dtype: " + str(self.column.dtype)
+
+    def get_lines(self, start: int, stop: int) -> list:
+        lines = []
+        rows = self.column.iloc[start:min(stop, len(self.column))]
+        if len(rows) > 0:
+            lines = rows.rename_axis(None).to_string(name=False, dtype=False, length=False).split("\n")
+        if stop > len(self.column) >= start:
+            lines.append(self.footer())
+        return lines
+
+    def __iter__(self):
+        for start in range(0, len(self), self.chunk):
+            yield from self.get_lines(start, start + self.chunk)
+
+
+
 # box and whisker plot
 def series_boxplot(column: pd.Series):
     plt.boxplot(column)
@@ -126,8 +162,23 @@ class Dataframe:
     Main data structure for a pandas dataframe
     """
 
-    def __init__(self, csv_name: str, memory_bank, delimeter=None):
+    def __init__(self, csv_name: str, memory_bank, delimeter=None, frame=None):
+        """
+        :param csv_name: file to read, relative to the current directory of base
+        :param memory_bank: pointer to the memory bank
+        :param delimeter: optional delimeter, "whitespace" splits on any whitespace
+        :param frame: an already loaded pandas dataframe (e.g. from a saved session), csv_name is then
+                      only kept as the source of the data
+        """
         self.settings = memory_bank.variables["settings"]
+        self.source = csv_name
+        # bumped by memo.touch whenever df changes so cached views are recomputed
+        self.version = 0
+
+        if frame is not None:
+            self.df = frame
+            return
+
         path = memory_bank.variables["base"].cwd
         path = path.replace("~", memory_bank.variables["base"].base)
         path += "/" + csv_name
@@ -187,14 +238,22 @@ class Dataframe:
 
 
 
+    @memoized
+    def column_stats(self, subsection: str, round_to) -> str:
+        # round_to is part of the cache key so a new setting recomputes the stats
+        return get_series_stats(self.df[subsection], settings=self.settings)
+
+
+    @memoized
+    def column_counts(self, subsection: str) -> pd.Series:
+        return self.df[subsection].value_counts()
+
+
     def view_subsection(self, subsection, vars=None) -> str:
 
         # If asking to view column names
         if subsection == "columns":
-            build_string = ""
-            for col in self.get_all_column_names():
-                build_string += col + "\n"
-            return build_string[:-1]
+            return iter(self.get_all_column_names())
 
         # If invalid item after . then throw error
         elif subsection not in self.get_all_column_names():
@@ -205,14 +264,14 @@ class Dataframe:
         else:
             # No vars just display whole
             if vars is None:
-                return str(self.df[subsection])
+                return SeriesLines(self.df[subsection])
 
             # Check for stats
             elif vars[0] == STATS:
                 if str(self.df[subsection].dtype) == "object":
                     print_err("ERROR: cannot get stats on series of type object")
                 else:
-                    return get_series_stats(self.df[subsection], settings=self.settings)
+                    return self.column_stats(subsection, self.settings.get("round_to"))
 
             # Graph a box and whiskers plot
             elif vars[0] == BOXPLOT:
@@ -239,8 +298,7 @@ class Dataframe:
 
             # View counts
             elif vars[0] == COUNTS:
-                all_counts = self.df[subsection].value_counts()
-                return str(all_counts)
+                return SeriesLines(self.column_counts(subsection))
 
             # View a scatter plot
             elif vars[0] == SCATTER:
@@ -281,25 +339,28 @@ class Dataframe:
 
 
 
-    def handle(self, command: list):
-        if len(command) < 2:
-            return
+    def view_command(self, subsection=None, vars=None) -> str:
+        if subsection is None:
+            return self.view()
+        return self.view_subsection(subsection=subsection, vars=vars)
 
-        if command[1] == VIEW and len(command) > 3:
-            print(self.view_subsection(subsection=command[2], vars=command[3:]))
-        elif command[1] == VIEW and len(command) > 2:
-            print(self.view_subsection(subsection=command[2], vars=None))
-        elif command[1] == VIEW:
-            print(self.view())
-        elif command[1] == HELP:
-            print(self.help())
-        elif command[1] == GRAPH:
-            if command[2] not in self.get_all_column_names() or command[3] not in self.get_all_column_names():
-                print_err("ERROR: " + command[2] + " and " + command[3] + " must be valid column names")
-            else:
-                plt.scatter(self.df[command[2]], self.df[command[3]])
-                plt.title(str(command[2] + " vs " + command[3]))
-                plt.show()
 
+    def graph(self, x_column: str, y_column: str):
+        if x_column not in self.get_all_column_names() or y_column not in self.get_all_column_names():
+            print_err("ERROR: " + x_column + " and " + y_column + " must be valid column names")
         else:
-            print_err("ERROR: unknown dataframe command: " + command[1])
+            plt.scatter(self.df[x_column], self.df[y_column])
+            plt.title(str(x_column + " vs " + y_column))
+            plt.show()
+
+
+    def handle(self, command: list):
+        return COMMANDS.dispatch(self, command)
+
+
+
+COMMANDS = CommandTable("dataframe", {
+    VIEW: Command("view_command", [Arg("subsection", optional=True), Arg("vars", rest=True)]),
+    HELP: Command("help"),
+    GRAPH: Command("graph", [Arg("x-column"), Arg("y-column")]),
+})
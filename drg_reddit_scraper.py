@@ -1,7 +1,8 @@
 import praw
 from colorama import Fore
-import pandas as pd
-from tabulate import tabulate
+from table import Table
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
 
 
 
@@ -29,9 +30,6 @@ BIOMES = {
 
 
 
-def print_err(text):
-    print(Fore.RED + text + Fore.RESET)
-
 
 class DRGRedditScraper:
 
@@ -137,12 +135,11 @@ class DRGRedditScraper:
                     buildstring += BIOMES[biome]
 
             buildstring += dd_title + "\n\n"
-            df = pd.DataFrame({'STAGE': dd_stage,
-                               'PRIMARY': dd_primary,
-                               'SECONDARY': dd_secondary,
-                               'ANOMALY': dd_anomaly,
-                               'WARNING': dd_warning})
-            buildstring += tabulate(df, headers='keys', tablefmt='fancy_grid')
+            buildstring += str(Table.from_columns({'STAGE': dd_stage,
+                                                   'PRIMARY': dd_primary,
+                                                   'SECONDARY': dd_secondary,
+                                                   'ANOMALY': dd_anomaly,
+                                                   'WARNING': dd_warning}))
             buildstring += "\n\n\n" + Fore.RESET
 
             for biome in BIOMES:
@@ -150,12 +147,11 @@ class DRGRedditScraper:
                     buildstring += BIOMES[biome]
 
             buildstring += edd_title + "\n\n"
-            df = pd.DataFrame({'STAGE': edd_stage,
-                               'PRIMARY': edd_primary,
-                               'SECONDARY': edd_secondary,
-                               'ANOMALY': edd_anomaly,
-                               'WARNING': edd_warning})
-            buildstring += tabulate(df, headers='keys', tablefmt='fancy_grid')
+            buildstring += str(Table.from_columns({'STAGE': edd_stage,
+                                                   'PRIMARY': edd_primary,
+                                                   'SECONDARY': edd_secondary,
+                                                   'ANOMALY': edd_anomaly,
+                                                   'WARNING': edd_warning}))
             buildstring += "\n\n"  + Fore.RESET
 
             return buildstring
@@ -186,20 +182,11 @@ class DRGRedditScraper:
         return build_str
 
     def handle(self, command:list):
-        if len(command) < 2:
-            return
-
-        if command[1] == VIEW and len(command) > 2:
-            print(self.view(vars=command[2:]))
-
-        elif command[1] == VIEW:
-            print(self.view())
-
-        elif command[1] == HELP:
-            print(self.help())
-
-        else:
-            print_err("ERROR: unknown drg command: " + command[1])
+        return COMMANDS.dispatch(self, command)
 
 
 
+COMMANDS = CommandTable("drg", {
+    VIEW: Command("view", [Arg("vars", rest=True)]),
+    HELP: Command("help"),
+})
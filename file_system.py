@@ -1,18 +1,219 @@
 
 from colorama import init, Fore, Back, Style
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import fnmatch
 import os
 import re
+import threading
+import time
+from shell_io import print_err, format_bytes
 
 
-def print_err(text):
-    print(Fore.RED + text)
+# limits for base view unless others are given
+DEFAULT_VIEW_DEPTH = 4
+DEFAULT_VIEW_ENTRIES = 1000
+DU = "du"
 
+# listing directories is mostly waiting on the disk or network, so walks use many threads
+WALK_WORKERS = 16
+SIZE_FLAG = "--size"
+NEWER_FLAG = "--newer"
+# a pattern written as /pattern/ is a regular expression searched for in the path, anything else is a glob
+REGEX_MARK = "/"
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+AGE_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
 
+
+
+# ===========================================
+#              DIRECTORY INDEX
+# ===========================================
+class DirectoryIndex:
+    """
+    Caches the entries of every directory that has been listed, sorted by name
+    A directory is only scanned again once its mtime changes, which happens whenever an entry
+    is added, removed or renamed in it. The cached os.DirEntry objects know whether they are
+    directories without a stat and keep their stat once it has been asked for.
+    """
+
+    def __init__(self):
+        self.listings: Dict[str, Tuple[int, List[os.DirEntry]]] = dict()
+        self.lock = threading.Lock()
+
+
+    def listing(self, path: str) -> List[os.DirEntry]:
+        """
+        :raises OSError: if path cannot be read
+        """
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with os.scandir(path) as scan:
+            entries = sorted(scan, key=lambda entry: entry.name)
+        with self.lock:
+            self.listings[path] = (mtime, entries)
+        return entries
+
+
+    def clear(self):
+        with self.lock:
+            self.listings.clear()
+
+
+    def walk(self, root: str, workers: int = WALK_WORKERS):
+        """
+        Every entry under root, listing directories on a thread pool
+        Symlinked directories are not descended into, so no tree is visited twice. A directory is always
+        yielded before anything in it.
+        :return: a generator of (path of the entry's directory relative to root, entry), with an entry of None
+                 for a directory that could not be read
+        """
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            # future -> path of its directory relative to root
+            running = {executor.submit(self.listing, root): ""}
+            while len(running) > 0:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative = running.pop(future)
+                    try:
+                        entries = future.result()
+                    except OSError:
+                        yield relative, None
+                        continue
+
+                    for entry in entries:
+                        if is_real_dir(entry):
+                            path = relative + "/" + entry.name if relative else entry.name
+                            running[executor.submit(self.listing, entry.path)] = path
+                        yield relative, entry
+        finally:
+            # stop listing when the entries are no longer wanted
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def is_real_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def fresh_stat(entry: os.DirEntry, follow_symlinks: bool = True) -> Optional[os.stat_result]:
+    """
+    Stat an entry again rather than trust the stat cached with its listing,
+    a file can change without its directory's mtime changing
+    """
+    try:
+        return os.stat(entry.path, follow_symlinks=follow_symlinks)
+    except OSError:
+        return None
+
+
+
+# ===========================================
+#                    FIND
+# ===========================================
+
+def parse_size(text: str) -> Optional[Callable[[int], bool]]:
+    """
+    Turn >N or <N, with an optional K, M or G suffix, into a test on a file size
+    """
+    match = re.fullmatch(r"([<>]?)(\d+(?:\.\d+)?)([kmg]?)b?", text.strip().lower())
+    if match is None:
+        return None
+    limit = float(match.group(2)) * SIZE_UNITS[match.group(3)]
+    if match.group(1) == "<":
+        return lambda size: size < limit
+    return lambda size: size > limit
+
+
+def parse_time(text: str) -> Optional[float]:
+    """
+    Turn an age like 3d, 12h or 30m, or a date like 2022-05-01 or 2022-05-01T12:00, into a timestamp
+    """
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", text.strip().lower())
+    if match is not None:
+        return time.time() - float(match.group(1)) * AGE_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(text.strip()).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_find_options(options: Optional[List[str]]):
+    """
+    :return: (size test or None, newer than timestamp or None), or None if the options are invalid
+    """
+    size_test = None
+    newer = None
+    options = options or []
+    while len(options) > 0:
+        if options[0] not in [SIZE_FLAG, NEWER_FLAG]:
+            print_err("ERROR: unknown find option " + options[0])
+            return None
+        if len(options) < 2:
+            print_err("ERROR: " + options[0] + " requires a value")
+            return None
+        if options[0] == SIZE_FLAG:
+            size_test = parse_size(options[1])
+            if size_test is None:
+                print_err("ERROR: " + options[1] + " is not a valid size, e.g. >10M or <500K")
+                return None
+        else:
+            newer = parse_time(options[1])
+            if newer is None:
+                print_err("ERROR: " + options[1] + " is not a valid time, e.g. 3d, 12h or 2022-05-01")
+                return None
+        options = options[2:]
+    return size_test, newer
+
+
+def compile_pattern(pattern: str) -> Optional[Callable[[str, str], bool]]:
+    """
+    :return: a test on (name, path relative to the search root)
+    """
+    if len(pattern) > 2 and pattern.startswith(REGEX_MARK) and pattern.endswith(REGEX_MARK):
+        try:
+            regex = re.compile(pattern[1:-1])
+        except re.error:
+            print_err("ERROR: " + pattern + " is not a valid regular expression")
+            return None
+        return lambda name, path: regex.search(path) is not None
+    return lambda name, path: fnmatch.fnmatch(name, pattern)
+
+
+
+# ===========================================
+#              FOLDER STRUCTURE
+# ===========================================
 class FolderStructure:
 
     def __init__(self, base: str):
         self.base = base
         self.cwd = "~"
+        self.index = DirectoryIndex()
+
+
+    def set_base(self, base: str):
+        """
+        Point ~ at a new folder, returning to ~ if the current directory does not exist there
+        """
+        self.base = base
+        self.index.clear()
+        if not os.path.isdir(self.cwd.replace("~", self.base)):
+            self.cwd = "~"
 
 
     def cd(self, path:str):
@@ -44,13 +245,11 @@ class FolderStructure:
 
     def ls(self):
         full_path = self.cwd.replace("~", self.base)
-        full_list = os.listdir(full_path)
-
-        for element in full_list:
-            if os.path.isdir(os.path.join(full_path, element)):
-                print(Fore.LIGHTMAGENTA_EX + element)
+        for entry in self.index.listing(full_path):
+            if is_dir(entry):
+                yield Fore.LIGHTMAGENTA_EX + entry.name + Fore.RESET
             else:
-                print(Fore.LIGHTBLUE_EX + element)
+                yield Fore.LIGHTBLUE_EX + entry.name + Fore.RESET
 
 
     # TODO: implement make directory
@@ -62,22 +261,183 @@ class FolderStructure:
         return "folder_structure"
 
 
-    def __recursive_view_files(self, build_string: str, full_path: str, num_indents: int) -> str:
-        full_list = os.listdir(full_path)
+    def __walk(self, full_path: str, max_depth: int):
+        """
+        Walk the tree under full_path depth first with an explicit stack, yielding (depth, entry) as it goes
+        An entry of None marks a directory that could not be read
+        """
+        try:
+            stack = [(0, iter(self.index.listing(full_path)))]
+        except OSError:
+            yield 0, None
+            return
+
+        while len(stack) > 0:
+            depth, entries = stack[-1]
+            entry = next(entries, None)
+            if entry is None:
+                stack.pop()
+                continue
+            yield depth, entry
+            if depth + 1 < max_depth and is_real_dir(entry):
+                try:
+                    stack.append((depth + 1, iter(self.index.listing(entry.path))))
+                except OSError:
+                    yield depth + 1, None
 
-        for element in full_list:
-            if os.path.isdir(os.path.join(full_path, element)):
-                build_string += Fore.RESET + ("| " * (num_indents - 1)) + ("┕ " if num_indents > 0 else "") + Fore.LIGHTMAGENTA_EX + element + "\n"
-                build_string += self.__recursive_view_files("", full_path + "/" + element, num_indents + 1)
+
+    def disk_usage(self, full_path: str) -> Tuple[Dict[str, List[int]], Dict[str, List[os.DirEntry]], int]:
+        """
+        Total the bytes and files under every directory below full_path in one post-order pass
+        :return: directory path relative to full_path -> [bytes, files], the same -> its subdirectories,
+                 and the number of directories that could not be read
+        """
+        # directories in the order they are reached, so reversed every directory comes before its parent
+        order = [("", None)]
+        totals: Dict[str, List[int]] = {"": [0, 0]}
+        children: Dict[str, List[os.DirEntry]] = {"": []}
+        unreadable = 0
+        for relative, entry in self.index.walk(full_path):
+            if entry is None:
+                unreadable += 1
+            elif is_real_dir(entry):
+                path = relative + "/" + entry.name if relative else entry.name
+                order.append((path, relative))
+                totals[path] = [0, 0]
+                children[path] = []
+                children[relative].append(entry)
             else:
-                build_string += Fore.RESET + ("| " * (num_indents - 1)) + ("┕ " if num_indents > 0 else "") + Fore.LIGHTBLUE_EX + element + "\n"
-        return build_string
+                stat = fresh_stat(entry, follow_symlinks=False)
+                if stat is not None:
+                    totals[relative][0] += stat.st_size
+                    totals[relative][1] += 1
+
+        for path, parent in reversed(order):
+            if parent is not None:
+                totals[parent][0] += totals[path][0]
+                totals[parent][1] += totals[path][1]
+        return totals, children, unreadable
 
 
-    def view(self, vars=None) -> str:
+    def view(self, vars=None):
+        """
+        Stream the tree under the current directory
+        :param vars: optional [du] [depth] [max entries], defaults DEFAULT_VIEW_DEPTH and DEFAULT_VIEW_ENTRIES
+                     du shows only directories, largest first, with the bytes and files under each
+        """
+        vars = vars or []
+        du = len(vars) > 0 and vars[0] == DU
+        if du:
+            vars = vars[1:]
+
+        limits = [DEFAULT_VIEW_DEPTH, DEFAULT_VIEW_ENTRIES]
+        for i, var in enumerate(vars[:2]):
+            try:
+                limits[i] = int(var)
+            except ValueError:
+                print_err("ERROR: " + var + " is not a valid " + ("depth" if i == 0 else "number of entries"))
+                return None
+        max_depth, max_entries = limits
+
         full_path = self.cwd.replace("~", self.base)
-        build_string = self.__recursive_view_files("", full_path, 0)
-        return build_string
+        if du:
+            return self.__view_usage(full_path, max_depth, max_entries)
+        return self.__view_files(full_path, max_depth, max_entries)
+
+
+    def __view_files(self, full_path: str, max_depth: int, max_entries: int):
+        shown = 0
+        for depth, entry in self.__walk(full_path, max_depth):
+            prefix = Fore.RESET + ("| " * (depth - 1)) + ("┕ " if depth > 0 else "")
+            if entry is None:
+                yield Fore.RESET + ("| " * depth) + Fore.LIGHTRED_EX + "(unreadable)" + Fore.RESET
+                continue
+            if shown >= max_entries:
+                yield Fore.LIGHTBLACK_EX + "... stopped after " + str(max_entries) + \
+                      " entries, see v base [depth] [entries]" + Fore.RESET
+                return
+            shown += 1
+            color = Fore.LIGHTMAGENTA_EX if is_dir(entry) else Fore.LIGHTBLUE_EX
+            yield prefix + color + entry.name + Fore.RESET
+
+
+    def __view_usage(self, full_path: str, max_depth: int, max_entries: int):
+        totals, children, unreadable = self.disk_usage(full_path)
+
+        def usage(path: str) -> str:
+            size, files = totals[path]
+            return Fore.LIGHTYELLOW_EX + "  " + format_bytes(size) + Fore.LIGHTBLACK_EX + "  " + str(files) + \
+                   (" file" if files == 1 else " files") + Fore.RESET
+
+        def child_path(path: str, entry: os.DirEntry) -> str:
+            return path + "/" + entry.name if path else entry.name
+
+        def largest_first(path: str):
+            return iter(sorted(((child_path(path, entry), entry) for entry in children[path]),
+                               key=lambda child: totals[child[0]][0], reverse=True))
+
+        yield Fore.LIGHTMAGENTA_EX + self.cwd + Fore.RESET + usage("")
+        shown = 1
+        stack = [(1, largest_first(""))]
+        while len(stack) > 0:
+            depth, entries = stack[-1]
+            path, entry = next(entries, (None, None))
+            if entry is None:
+                stack.pop()
+                continue
+            if shown >= max_entries:
+                yield Fore.LIGHTBLACK_EX + "... stopped after " + str(max_entries) + \
+                      " entries, see v base du [depth] [entries]" + Fore.RESET
+                break
+            shown += 1
+            yield Fore.RESET + ("| " * (depth - 1)) + "┕ " + Fore.LIGHTMAGENTA_EX + entry.name + Fore.RESET + \
+                  usage(path)
+            if depth < max_depth:
+                stack.append((depth + 1, largest_first(path)))
+
+        if unreadable > 0:
+            yield Fore.LIGHTRED_EX + str(unreadable) + " directories could not be read and are counted as empty" + \
+                  Fore.RESET
+
+
+    def find(self, pattern: str, options: Optional[List[str]] = None):
+        """
+        Search the tree under the current directory, listing directories on a thread pool
+        Directories that have not changed since they were last listed come from the index
+        :param pattern: a glob matched against names, or /regex/ searched for in paths
+        :param options: --size >N|<N and --newer age|date
+        :return: a generator of matching paths, in the order they are found
+        """
+        matches = compile_pattern(pattern)
+        parsed = parse_find_options(options)
+        if matches is None or parsed is None:
+            return None
+        size_test, newer = parsed
+        return self.__find(self.cwd.replace("~", self.base), matches, size_test, newer)
+
+
+    def __find(self, root: str, matches, size_test, newer):
+        for relative, entry in self.index.walk(root):
+            if entry is None:
+                print_err("ERROR: could not read " + self.cwd + ("/" + relative if relative else ""))
+                continue
+            path = relative + "/" + entry.name if relative else entry.name
+            if not matches(entry.name, path):
+                continue
+
+            directory = is_dir(entry)
+            if size_test is not None or newer is not None:
+                # only matches are stat'ed
+                stat = fresh_stat(entry)
+                if stat is None:
+                    continue
+                if size_test is not None and (directory or not size_test(stat.st_size)):
+                    continue
+                if newer is not None and stat.st_mtime <= newer:
+                    continue
+            color = Fore.LIGHTMAGENTA_EX if directory else Fore.LIGHTBLUE_EX
+            yield color + self.cwd + "/" + path + Fore.RESET
+
 
     def handle(self, command:list):
         pass
@@ -2,7 +2,18 @@
 import memory_bank as mb
 from colorama import init, Fore, Back, Style
 import os
+import sys
+import argparse
 import data_files_util as dfu
+import shell_io
+from shell_io import print_err
+from command_parser import parse_pipeline, ParseError
+import pipeline
+import jobs
+import profiler
+import pager
+import daemon
+import watcher
 
 
 # initialize colorama
@@ -10,6 +21,7 @@ init(convert=True, autoreset=True)
 
 PROMPT_START_PAR = "["
 LOCAL_PROGRAM = "GNAT"
+DAEMON_PROGRAM = "GNAT@DAEMON"
 PROMPT_END_PAR = "]"
 PROMPT_SYMBOL = " >> "
 
@@ -19,6 +31,15 @@ PROMPT_SYMBOL = " >> "
 #                  KEYWORDS
 # ===========================================
 EXIT = "exit"
+COMMENT = "#"
+
+
+
+# background jobs started with &
+JOB_TABLE = jobs.JobTable()
+
+# set when running as a daemon for other shells
+SERVING = False
 
 
 
@@ -26,9 +47,6 @@ EXIT = "exit"
 #              GLOBAL FUNCTIONS
 # ===========================================
 
-def print_err(text):
-    print(Fore.RED + text)
-
 
 def std_display(text):
     print(Fore.YELLOW + text)
@@ -48,11 +66,12 @@ def display_header():
 
 
 # Directs the command based on first keyword
-def handle_command(command: list, memory: mb.MemoryBank):
+def handle_command(command: list, memory: mb.MemoryBank, pipes: list = None):
     """
     Handles command sent from command loop
-    :param command: the command split on spaces
+    :param command: the command tokens
     :param memory: pointer to the memory bank
+    :param pipes: tokens of the filters the output is piped through
     :return: None
     """
     if len(command) < 1:
@@ -60,10 +79,88 @@ def handle_command(command: list, memory: mb.MemoryBank):
         return
 
     if command[0] == EXIT:
+        # the daemon's memory bank is shared, exit only ends the client's connection
+        if not SERVING:
+            memory.close()
         exit(0)
 
+    elif command[0] == profiler.TIME:
+        if len(command) < 2:
+            print_err("ERROR: time requires a command")
+        else:
+            profiler.time_command(lambda: handle_command(command[1:], memory, pipes=pipes))
+
+    elif command[0] == profiler.PROFILE:
+        options = profiler.parse_profile_options(command[1:])
+        if options is None:
+            return
+        top, dump, profiled = options
+        if len(profiled) < 1:
+            print_err("ERROR: prof requires a command")
+        else:
+            profiler.profile_command(lambda: handle_command(profiled, memory, pipes=pipes), top=top, dump=dump)
+
+    elif command[0] == pager.PAGE:
+        if len(command) < 2:
+            print_err("ERROR: page requires a command")
+        else:
+            pager.page(command_result(command[1:], memory, pipes=pipes))
+
+    else:
+        shell_io.write_output(command_result(command, memory, pipes=pipes))
+
+
+def command_result(command: list, memory: mb.MemoryBank, pipes: list = None):
+    """
+    Run a command and its pipes without printing the result
+    :return: the output of the last stage, a string, generator of lines, or None
+    """
+    if command[0] in jobs.COMMANDS:
+        result = jobs.COMMANDS.dispatch(JOB_TABLE, command)
+    else:
+        result = memory.handle(command)
+    if pipes is not None and len(pipes) > 0:
+        result = pipeline.run_filters(shell_io.as_lines(result), pipes)
+    return result
+
+
+def parse_command(line: str):
+    """
+    Tokenize a command line, printing an error if it cannot be parsed
+    :return: the tokens of each stage of the pipeline and whether to run it in the background,
+             or None if the line is invalid
+    """
+    try:
+        return parse_pipeline(line)
+    except ParseError as e:
+        print_err(str(e))
+        return None
+
+
+def run_line(line: str, memory: mb.MemoryBank):
+    """
+    Parse and run one command line, starting a background job if it ends in &
+    """
+    parsed = parse_command(line)
+    if parsed is None:
+        return
+
+    stages, background = parsed
+    if len(stages[0]) == 0:
+        # a blank line does nothing, a lone & has nothing to run
+        if background:
+            print_err("ERROR: & requires a command")
+        return
+    if background:
+        JOB_TABLE.start(line.strip().rstrip("&").strip(),
+                        lambda: handle_command(stages[0], memory, pipes=stages[1:]))
     else:
-        memory.handle(command)
+        handle_command(stages[0], memory, pipes=stages[1:])
+
+
+def report_jobs():
+    for job in JOB_TABLE.finished_jobs():
+        print(job.report())
 
 
 
@@ -72,30 +169,187 @@ def handle_command(command: list, memory: mb.MemoryBank):
 #             MAIN COMMAND LOOP
 # ===========================================
 
+def load_memory() -> mb.MemoryBank:
+    settings = dfu.Datafile("settings.txt")
+    memory = mb.MemoryBank(settings)
+
+    # pick up edits to settings.txt without restarting
+    interval = settings.get("watch_interval")
+    settings_watcher = watcher.FileWatcher(interval if interval is not None else watcher.DEFAULT_INTERVAL)
+    settings_watcher.watch(settings, memory.apply_settings)
+    settings_watcher.start()
+    return memory
+
+
 def command_loop():
     done = False
     pinned = None
-    settings = dfu.Datafile("settings.txt")
-    memory = mb.MemoryBank(settings)
+    memory = load_memory()
 
     while not done:
+        report_jobs()
+        draw_prompt(pinned)
+        run_line(input(""), memory)
+
+
+def draw_prompt(pinned=None, program=LOCAL_PROGRAM):
+    full_format(PROMPT_START_PAR, Fore.GREEN, end="")
+    full_format(program, Fore.WHITE, end="")
+    full_format(PROMPT_END_PAR, Fore.GREEN, end="")
+    if pinned is not None:
         full_format(PROMPT_START_PAR, Fore.GREEN, end="")
-        full_format(LOCAL_PROGRAM, Fore.WHITE, end="")
+        full_format(pinned, Fore.WHITE, end="")
         full_format(PROMPT_END_PAR, Fore.GREEN, end="")
-        if pinned is not None:
-            full_format(PROMPT_START_PAR, Fore.GREEN, end="")
-            full_format(pinned, Fore.WHITE, end="")
-            full_format(PROMPT_END_PAR, Fore.GREEN, end="")
-        full_format(PROMPT_SYMBOL, Fore.GREEN, end="")
-        command = input("")
+    full_format(PROMPT_SYMBOL, Fore.GREEN, end="")
+
+
+
+
+
+# ===========================================
+#            NON-INTERACTIVE MODE
+# ===========================================
+
+def run_script(lines, memory: mb.MemoryBank, stop_on_error: bool = False) -> int:
+    """
+    Runs every command in a script through handle_command without drawing prompts
+    :param lines: iterable of command lines, blank lines and lines starting with # are skipped
+    :param memory: pointer to the memory bank
+    :param stop_on_error: stop at the first command that reports an error
+    :return: exit code, 0 if every command succeeded and 1 otherwise
+    """
+    failed = False
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if len(line) == 0 or line.startswith(COMMENT):
+            continue
+
+        errors_before = shell_io.get_error_count()
+        try:
+            run_line(line, memory)
+        except SystemExit:
+            break
+        except Exception as e:
+            print_err("ERROR: line " + str(line_number) + ": " + line + ": " + str(e))
+
+        if shell_io.get_error_count() > errors_before:
+            failed = True
+            if stop_on_error:
+                print_err("ERROR: stopping script at line " + str(line_number))
+                break
+
+    # background jobs finish before the script does
+    JOB_TABLE.wait_all()
+    for job in JOB_TABLE.finished_jobs():
+        print(job.report())
+        if job.status == jobs.FAILED:
+            failed = True
+
+    return 1 if failed else 0
+
+
+def run_script_file(path: str, stop_on_error: bool = False) -> int:
+    memory = load_memory()
+    if path == "-":
+        return run_script(sys.stdin, memory, stop_on_error=stop_on_error)
+
+    try:
+        script = open(path, "r")
+    except OSError:
+        print_err("ERROR: could not open script " + path)
+        return 2
+
+    with script:
+        return run_script(script, memory, stop_on_error=stop_on_error)
 
-        handle_command(command.split(" "), memory)
 
+# ===========================================
+#                DAEMON MODE
+# ===========================================
+
+def serve(path: str, mode: int = daemon.DEFAULT_SOCKET_MODE) -> int:
+    """
+    Keep one memory bank loaded and run the commands of every connected client against it
+    """
+    global SERVING
+    SERVING = True
+    memory = load_memory()
+
+    def serve_line(line: str):
+        run_line(line, memory)
+        report_jobs()
 
+    return daemon.serve(path, serve_line, mode=mode)
 
 
+def input_lines():
+    while True:
+        try:
+            yield input("")
+        except EOFError:
+            return
+
+
+def connect(path: str, script=None, stop_on_error: bool = False) -> int:
+    """
+    Send commands to a running daemon, from a script or typed at a prompt
+    """
+    if script is None:
+        return daemon.connect(path, input_lines(), prompt=lambda: draw_prompt(program=DAEMON_PROGRAM))
+    if script == "-":
+        return daemon.connect(path, iter(sys.stdin), stop_on_error=stop_on_error)
+
+    try:
+        script_file = open(script, "r")
+    except OSError:
+        print_err("ERROR: could not open script " + script)
+        return 2
+    with script_file:
+        return daemon.connect(path, iter(script_file), stop_on_error=stop_on_error)
+
+
+def socket_mode(text: str) -> int:
+    try:
+        mode = int(text, 8)
+    except ValueError:
+        raise argparse.ArgumentTypeError(text + " is not an octal mode such as 600 or 660")
+    if mode > 0o777:
+        raise argparse.ArgumentTypeError(text + " is not an octal mode such as 600 or 660")
+    return mode
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="A shell for Data Science and possibly other random stuff")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run every command in FILE without prompting, - reads from stdin")
+    parser.add_argument("--stdin", action="store_true",
+                        help="run commands piped on stdin without prompting")
+    parser.add_argument("-e", "--stop-on-error", action="store_true",
+                        help="stop a script at the first command that fails")
+    parser.add_argument("--serve", metavar="SOCKET", nargs="?", const=daemon.default_socket_path(),
+                        help="hold one memory bank and accept commands over a unix domain socket")
+    parser.add_argument("--connect", metavar="SOCKET", nargs="?", const=daemon.default_socket_path(),
+                        help="send commands to a running --serve daemon")
+    parser.add_argument("--socket-mode", metavar="MODE", type=socket_mode, default=daemon.DEFAULT_SOCKET_MODE,
+                        help="octal permissions of the --serve socket, e.g. 660 to share it with your group")
+    return parser.parse_args(argv)
+
 
 def main():
+    shell_io.install_output_router()
+    args = parse_args()
+    script = args.script if args.script is not None else ("-" if args.stdin else None)
+
+    if args.serve is not None:
+        sys.exit(serve(args.serve, mode=args.socket_mode))
+
+    if args.connect is not None:
+        sys.exit(connect(args.connect, script=script, stop_on_error=args.stop_on_error))
+
+    if args.script is not None or args.stdin:
+        sys.exit(run_script_file(args.script if args.script is not None else "-",
+                                 stop_on_error=args.stop_on_error))
+
     display_header()
     command_loop()
 
@@ -2,6 +2,9 @@ import csv
 from typing import Dict, Union
 import math
 from colorama import Fore
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
+from memo import memoized
 
 
 
@@ -14,9 +17,6 @@ SPREAD = "spread"
 HELP = "help"
 
 
-def print_err(text):
-    print(Fore.RED + text)
-
 
 
 class IaafTableValue:
@@ -122,18 +122,20 @@ class IaafConverter:
 
 
 
-    def view(self, vars=None) -> str:
-        buildstring = ""
+    @memoized
+    def event_table(self, event: str) -> list:
+        lines = [event + ":", str(1) + " : " + self.get_mark(event, 1)]
+        for i in range(50, 1501, 50):
+            lines.append(str(i) + " : " + self.get_mark(event, i))
+        return lines
+
+
+    def view(self, vars=None):
         if vars is None:
-            for event in self.tables.keys():
-                buildstring += event + "\n"
+            yield from self.tables.keys()
         else:
             if vars[0] in self.tables.keys():
-                buildstring += vars[0] + ":\n"
-                buildstring += str(1) + " : " + self.get_mark(vars[0], 1) + "\n"
-                for i in range(50, 1501, 50):
-                    buildstring += str(i) + " : " + self.get_mark(vars[0], i) + "\n"
-        return buildstring
+                yield from self.event_table(vars[0])
 
 
     def help(self) -> str:
@@ -160,65 +162,58 @@ class IaafConverter:
 
 
 
-    def handle(self, command:list):
-        if len(command) < 2:
-            return
+    def mark_command(self, event: str, points: int) -> str:
+        try:
+            return self.get_mark(event, points)
+        except:
+            print_err("ERROR: " + str(points) + " is not a valid points value")
 
-        if command[1] == VIEW and len(command) > 2:
-            print(self.view(vars=command[2:]))
 
-        elif command[1] == VIEW:
-            print(self.view())
+    def points_command(self, event: str, mark: str) -> int:
+        try:
+            return self.get_points(event, mark)
+        except:
+            print_err("ERROR: " + mark + " is not a valid mark for the " + event)
 
-        elif command[1] == MARK:
-            if len(command) < 4:
-                print_err("ERROR: mark command requires and event name and points value")
-            else:
-                try:
-                    points = int(command[3])
-                    print(self.get_mark(command[2], points))
-                except:
-                    print_err("ERROR: " + command[3] + " is not a valid points value")
-
-        elif command[1] == POINTS:
-            if len(command) < 4:
-                print_err("ERROR: points command requires and event name and a mark value")
-            else:
-                try:
-                    print(self.get_points(command[2], command[3]))
-                except:
-                    print_err("ERROR: " + command[3] + " is not a valid mark for the " + command[2])
 
+    def spread(self, event: str, mark: str):
+        try:
+            points = self.get_points(event, mark)
+        except:
+            print_err("ERROR: " + mark + " is not a valid mark for the " + event)
+            return None
 
-        elif command[1] == SPREAD:
-            if len(command) < 4:
-                print_err("ERROR: spread command requires an event and a mark")
-            else:
-                try:
-                    points = self.get_points(command[2], command[3])
-                    for event in self.tables.keys():
-                        print(event + ": " + self.tables[event].get_formatted_mark(points))
+        if points is None:
+            return None
+        return (other_event + ": " + self.tables[other_event].get_formatted_mark(points)
+                for other_event in self.tables.keys())
 
-                except:
-                    print_err("ERROR: " + command[3] + " is not a valid mark for the " + command[2])
+
+    def convert(self, event: str, mark: str, other_event: str) -> str:
+        if event not in self.tables.keys() or other_event not in self.tables.keys():
+            print_err("ERROR: " + event + " and " + other_event + " must be valid events")
+        else:
+            try:
+                points = self.get_points(event, mark)
+                return self.tables[other_event].get_formatted_mark(points)
+            except:
+                print_err("ERROR: " + mark + " is not a valid mark for the " + event)
 
 
-        elif command[1] == CONVERT:
-            if len(command) < 5:
-                print_err("ERROR: convert command requires an event, a mark, and another event")
-            else:
-                if command[2] not in self.tables.keys() or command[4] not in self.tables.keys():
-                    print_err("ERROR: " + command[2] + " and " + command[4] + " must be valid events")
-                else:
-                    try:
-                        points = self.get_points(command[2], command[3])
-                        print(self.tables[command[4]].get_formatted_mark(points))
-                    except:
-                        print_err("ERROR: " + command[3] + " is not a valid mark for the " + command[2])
 
-        elif command[1] == HELP:
-            print(self.help())
+    def handle(self, command:list):
+        return COMMANDS.dispatch(self, command)
 
 
-        else:
-            print_err("ERROR: unknown world athletics conversion command: " + command[1])
+
+COMMANDS = CommandTable("world athletics conversion", {
+    VIEW: Command("view", [Arg("vars", rest=True)]),
+    MARK: Command("mark_command", [Arg("event"), Arg("points", cast=int, error="ERROR: {} is not a valid points value")],
+                  usage="ERROR: mark command requires and event name and points value"),
+    POINTS: Command("points_command", [Arg("event"), Arg("mark")],
+                    usage="ERROR: points command requires and event name and a mark value"),
+    SPREAD: Command("spread", [Arg("event"), Arg("mark")], usage="ERROR: spread command requires an event and a mark"),
+    CONVERT: Command("convert", [Arg("event"), Arg("mark"), Arg("other event")],
+                     usage="ERROR: convert command requires an event, a mark, and another event"),
+    HELP: Command("help"),
+})
@@ -0,0 +1,178 @@
+from colorama import Fore
+from typing import Dict, Callable, Optional
+from collections import OrderedDict
+import ctypes
+import io
+import threading
+import shell_io
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
+
+
+JOBS = "jobs"
+FOREGROUND = "fg"
+KILL = "kill"
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+KILLED = "killed"
+
+
+
+class JobCancelled(shell_io.OutputCancelled):
+    pass
+
+
+
+# ===========================================
+#                    JOB
+# ===========================================
+class Job:
+    """
+    One command running on a worker thread, everything it prints is buffered
+    until the job is brought to the foreground or reported as finished
+    """
+
+    def __init__(self, job_id: int, command_line: str, work: Callable):
+        self.id = job_id
+        self.command_line = command_line
+        self.work = work
+        self.output = io.StringIO()
+        self.status = RUNNING
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="gnat-job-" + str(job_id), daemon=True)
+
+
+    def run(self):
+        with shell_io.redirect_thread_output(self.output, cancelled=self.cancelled):
+            try:
+                self.work()
+                if self.status == RUNNING:
+                    self.status = FAILED if shell_io.get_error_count() > 0 else DONE
+            except shell_io.OutputCancelled:
+                self.status = KILLED
+            except SystemExit:
+                self.status = DONE
+            except Exception as e:
+                if self.cancelled.is_set():
+                    self.status = KILLED
+                else:
+                    self.status = FAILED
+                    self.output.write(Fore.RED + "ERROR: " + str(e) + Fore.RESET + "\n")
+
+
+    def is_finished(self) -> bool:
+        return not self.thread.is_alive() or self.status == KILLED
+
+
+    def cancel(self):
+        """
+        Stop the job: its next print raises, and pure python code is interrupted
+        between bytecodes. A job blocked inside a network call finishes in the
+        background but its output is thrown away.
+        """
+        self.cancelled.set()
+        self.status = KILLED
+        if self.thread.is_alive() and self.thread.ident is not None:
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread.ident),
+                                                       ctypes.py_object(JobCancelled))
+
+
+    def summary(self) -> str:
+        return "[" + str(self.id) + "] " + self.status + "\t" + self.command_line
+
+
+    def report(self) -> str:
+        build_string = Fore.LIGHTGREEN_EX + self.summary() + Fore.RESET
+        if self.status != KILLED:
+            text = self.output.getvalue()
+            if len(text) > 0:
+                build_string += "\n" + text.rstrip("\n") + Fore.RESET
+        return build_string
+
+
+
+
+# ===========================================
+#                 JOB TABLE
+# ===========================================
+class JobTable:
+    """
+    Keeps every background job until its output has been shown
+    """
+
+    def __init__(self):
+        self.jobs: Dict[int, Job] = OrderedDict()
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+
+    def start(self, command_line: str, work: Callable) -> Job:
+        with self.lock:
+            job = Job(self.next_id, command_line, work)
+            self.jobs[job.id] = job
+            self.next_id += 1
+        job.thread.start()
+        print(Fore.LIGHTGREEN_EX + "[" + str(job.id) + "] " + command_line + Fore.RESET)
+        return job
+
+
+    def get_job(self, job_id: int) -> Optional[Job]:
+        with self.lock:
+            if job_id not in self.jobs:
+                print_err("ERROR: no job " + str(job_id))
+                return None
+            return self.jobs[job_id]
+
+
+    def remove(self, job: Job):
+        with self.lock:
+            self.jobs.pop(job.id, None)
+
+
+    def finished_jobs(self) -> list:
+        """
+        Every job that finished since the last call, each one is only returned once
+        """
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.is_finished()]
+            for job in finished:
+                del self.jobs[job.id]
+        return finished
+
+
+    def wait_all(self):
+        for job in list(self.jobs.values()):
+            job.thread.join()
+
+
+    def view_jobs(self):
+        with self.lock:
+            return [job.summary() for job in self.jobs.values()]
+
+
+    def foreground(self, job_id: int) -> Optional[str]:
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        job.thread.join()
+        self.remove(job)
+        return job.report()
+
+
+    def kill(self, job_id: int):
+        job = self.get_job(job_id)
+        if job is None:
+            return
+        job.cancel()
+        self.remove(job)
+        print(Fore.LIGHTRED_EX + job.summary() + Fore.RESET)
+
+
+
+COMMANDS = CommandTable("job", {
+    JOBS: Command("view_jobs"),
+    FOREGROUND: Command("foreground", [Arg("job id", cast=int)], usage="ERROR: fg requires a job number"),
+    KILL: Command("kill", [Arg("job id", cast=int)], usage="ERROR: kill requires a job number"),
+}, position=0)
@@ -0,0 +1,147 @@
+from colorama import Fore
+from collections import OrderedDict
+from typing import Any, Tuple
+import functools
+import itertools
+import sys
+import threading
+
+
+DEFAULT_CAPACITY_MB = 256
+MEGABYTE = 1024 * 1024
+
+
+
+# unlike id(), these are never reused by a later object
+_owner_ids = itertools.count(1)
+
+
+def owner_id(owner) -> int:
+    if "memo_id" not in owner.__dict__:
+        owner.memo_id = next(_owner_ids)
+    return owner.memo_id
+
+
+def estimate_size(value) -> int:
+    """
+    Rough size of a cached result in bytes
+    """
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+
+# ===========================================
+#                 MEMO CACHE
+# ===========================================
+class MemoCache:
+    """
+    Least recently used cache of read-only view results
+    Keys start with the identity and version of the variable they were computed from,
+    so bumping a variable's version makes all of its old results unreachable.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY_MB * MEGABYTE):
+        self.capacity = capacity
+        self.entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    def set_capacity(self, capacity: int):
+        with self.lock:
+            self.capacity = capacity
+            self.evict()
+
+
+    def lookup(self, key: Tuple) -> Tuple[bool, Any]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key][0]
+            self.misses += 1
+            return False, None
+
+
+    def store(self, key: Tuple, value):
+        size = estimate_size(value)
+        with self.lock:
+            if size > self.capacity:
+                return
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            self.evict()
+
+
+    def evict(self):
+        while self.size > self.capacity and len(self.entries) > 0:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.size -= size
+
+
+    def invalidate(self, owner):
+        """
+        Drop every result computed from owner
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == owner_id(owner)]:
+                self.size -= self.entries.pop(key)[1]
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+    def type_string(self) -> str:
+        return "memo_cache"
+
+
+    def view(self, vars=None) -> str:
+        build_string = Fore.LIGHTBLUE_EX + "ENTRIES: " + str(len(self.entries)) + "\n"
+        build_string += "SIZE: " + str(round(self.size / MEGABYTE, 2)) + " MB of " + \
+                        str(round(self.capacity / MEGABYTE, 2)) + " MB\n"
+        build_string += "HITS: " + str(self.hits) + "\n"
+        build_string += "MISSES: " + str(self.misses) + Fore.RESET
+        return build_string
+
+
+
+# shared by every tool
+CACHE = MemoCache()
+
+
+
+def memoized(method):
+    """
+    Cache a method's result by (object identity, object version, method, arguments)
+    The object should have a version counter that it bumps (see touch) whenever it changes
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        key = (owner_id(self), getattr(self, "version", 0), method.__name__, args)
+        hit, value = CACHE.lookup(key)
+        if hit:
+            return value
+        value = method(self, *args)
+        CACHE.store(key, value)
+        return value
+    return wrapper
+
+
+def touch(owner):
+    """
+    Record that owner changed: bump its version and drop its cached results
+    """
+    owner.version = getattr(owner, "version", 0) + 1
+    CACHE.invalidate(owner)
@@ -3,15 +3,11 @@ from colorama import init, Fore, Back, Style
 import file_system
 import data_files_util as dfu
 import os
-
-import password_manager
-from dataframe_tool import Dataframe
-from iaaf_converter import IaafConverter
-from wikipedia import Wikipedia
-from drg_reddit_scraper import DRGRedditScraper
-from trivia import Trivia
-
-import requests
+import importlib
+import threading
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
+import memo
 
 
 
@@ -20,12 +16,21 @@ init(convert=True, autoreset=True)
 
 
 
-# used to print error messages
-def print_err(text):
-    print(Fore.RED + text)
 
+RESERVED = ["cd", "ls", "pwd", "mkdir", "v", "view", "cls", "pin", "help", "ip", "exit", "jobs", "fg", "kill",
+            "time", "prof", "save-session", "load-session", "page", "memo", "find",
+            "catalog", "peek", "head", "tail"]
 
-RESERVED = ["cd", "ls", "pwd", "mkdir", "v", "view", "cls", "pin", "help", "ip"]
+
+# Tools that are only imported and built the first time they are used
+# name -> (module, class, type string, settings passed to the constructor)
+TOOLS = {
+    "passwd": ("password_manager", "PasswordManager", "password_manager", ["passwd_file", "passwd_key"]),
+    "wa": ("iaaf_converter", "IaafConverter", "world_athletics_converter", []),
+    "wiki": ("wikipedia", "Wikipedia", "wikipedia_tool", []),
+    "drg": ("drg_reddit_scraper", "DRGRedditScraper", "drg_tool", []),
+    "trivia": ("trivia", "Trivia", "trivia_game", []),
+}
 
 
 
@@ -38,27 +43,63 @@ RESERVED = ["cd", "ls", "pwd", "mkdir", "v", "view", "cls", "pin", "help", "ip"]
 class MemoryBank:
     """
     Class that defines all storage of variables
+    The variable table is guarded by a lock so background jobs can share it
     """
 
     def __init__(self, settings: dfu.Datafile):
+        self.lock = threading.RLock()
         self.variables = dict()
         self.variables["mem"] = self
         self.variables["settings"] = settings
         self.variables["base"] = file_system.FolderStructure(settings.get("base"))
-        self.variables["passwd"] = password_manager.PasswordManager(settings.get("passwd_file"),
-                                                                    settings.get("passwd_key"))
-        self.variables["wa"] = IaafConverter()
-        self.variables["wiki"] = Wikipedia()
-        self.variables["drg"] = DRGRedditScraper()
-        self.variables["trivia"] = Trivia()
 
+        self.apply_settings(["memo_cap_mb"])
 
-    def var_exists(self, key: str) -> bool:
+
+    def apply_settings(self, changed: list):
+        """
+        Push new setting values to everything that copied them
+        Tools that hold the settings Datafile itself (like Dataframe) read the new values on their own
+        :param changed: names of the settings that changed
+        """
+        settings = self.variables["settings"]
+        if "base" in changed and settings.get("base") is not None:
+            self.variables["base"].set_base(settings.get("base"))
+
+        memo_cap = settings.get("memo_cap_mb")
+        if "memo_cap_mb" in changed and memo_cap is not None:
+            memo.CACHE.set_capacity(int(memo_cap) * memo.MEGABYTE)
+
+
+    def tool_loaded(self, key: str) -> bool:
         return key in self.variables.keys()
 
 
+    def load_tool(self, key: str):
+        """
+        Import and build a registered tool the first time it is needed
+        :param key: the name of the tool in TOOLS
+        :return: the built tool
+        """
+        with self.lock:
+            if not self.tool_loaded(key):
+                module_name, class_name, _, setting_names = TOOLS[key]
+                tool_class = getattr(importlib.import_module(module_name), class_name)
+                args = [self.variables["settings"].get(name) for name in setting_names]
+                self.variables[key] = tool_class(*args)
+            return self.variables[key]
+
+
+    def var_exists(self, key: str) -> bool:
+        with self.lock:
+            return key in self.variables.keys() or key in TOOLS
+
+
     def get_var(self, key: str):
-        return self.variables[key]
+        with self.lock:
+            if key in TOOLS:
+                return self.load_tool(key)
+            return self.variables[key]
 
 
     def type_string(self) -> str:
@@ -66,10 +107,11 @@ class MemoryBank:
 
 
     def add_var(self, key: str, value):
-        if self.var_exists(key) or key in RESERVED:
-            print_err("ERROR: " + key + " is a taken or reserved variable name in memory")
-        else:
-            self.variables[key] = value
+        with self.lock:
+            if self.var_exists(key) or key in RESERVED:
+                print_err("ERROR: " + key + " is a taken or reserved variable name in memory")
+            else:
+                self.variables[key] = value
 
 
     def get_subsection(self, subsection: str):
@@ -81,16 +123,24 @@ class MemoryBank:
 
 
     def view(self, vars=None) -> str:
+        with self.lock:
+            variables = list(self.variables.keys())
+            loaded = [self.variables[var] for var in variables]
+
         build_string = ""
-        for var in self.variables.keys():
+        for var, value in zip(variables, loaded):
             build_string += Fore.LIGHTRED_EX + var + Fore.RESET + " : " + Fore.LIGHTYELLOW_EX + \
-                            self.variables[var].type_string() + "\n"
+                            value.type_string() + "\n"
+        for tool in TOOLS.keys():
+            if tool not in variables:
+                build_string += Fore.LIGHTRED_EX + tool + Fore.RESET + " : " + Fore.LIGHTYELLOW_EX + \
+                                TOOLS[tool][2] + "\n"
         return build_string
 
 
     def view_subsection(self, subsection, vars=None) -> str:
-        if subsection in self.variables.keys():
-            return self.variables[subsection].view(vars=vars)
+        if self.var_exists(subsection):
+            return self.get_var(subsection).view(vars=vars)
         else:
             print_err("ERROR: " + subsection + " does not exist in memory")
 
@@ -104,13 +154,17 @@ class MemoryBank:
 
 
     def ls(self):
-        self.variables["base"].ls()
+        return self.variables["base"].ls()
 
 
     def mkdir(self, dir_name:str):
         self.variables["base"].mkdir(dir_name)
 
 
+    def find(self, pattern: str, options=None):
+        return self.variables["base"].find(pattern, options)
+
+
     def help(self) -> str:
         build_str = ""
         build_str += Fore.LIGHTBLUE_EX
@@ -129,6 +183,18 @@ class MemoryBank:
         build_str += "LIST FILES IN DIRECTORY:\n"
         build_str += Fore.LIGHTGREEN_EX + "ls\n\n" + Fore.LIGHTBLUE_EX
 
+        build_str += "VIEW THE TREE UNDER THE CURRENT DIRECTORY:\n"
+        build_str += Fore.LIGHTGREEN_EX + "v base " + Fore.LIGHTBLACK_EX + "{opt:depth} {opt:max-entries}\n\n" + \
+                     Fore.LIGHTBLUE_EX
+
+        build_str += "SHOW THE BYTES AND FILES UNDER EACH DIRECTORY, LARGEST FIRST:\n"
+        build_str += Fore.LIGHTGREEN_EX + "v base du " + Fore.LIGHTBLACK_EX + "{opt:depth} {opt:max-entries}\n\n" + \
+                     Fore.LIGHTBLUE_EX
+
+        build_str += "FIND FILES UNDER THE CURRENT DIRECTORY BY GLOB OR /REGEX/:\n"
+        build_str += Fore.LIGHTGREEN_EX + "find [pattern] " + Fore.LIGHTBLACK_EX + \
+                     "{opt:--size >N|<N (K, M, G)} {opt:--newer 3d|12h|2022-05-01}\n\n" + Fore.LIGHTBLUE_EX
+
         build_str += "CHANGE DIRECTORY:\n"
         build_str += Fore.LIGHTGREEN_EX + "cd [folder-name]\n\n" + Fore.LIGHTBLUE_EX
 
@@ -138,13 +204,49 @@ class MemoryBank:
         build_str += "CLEAR SCREEN:\n"
         build_str += Fore.LIGHTGREEN_EX + "cls\n\n" + Fore.LIGHTBLUE_EX
 
+        build_str += "SHOW THE FIRST OR LAST ROWS OF A CSV/TSV WITHOUT LOADING IT:\n"
+        build_str += Fore.LIGHTGREEN_EX + "peek [filename] " + Fore.LIGHTBLACK_EX + "{opt:rows}\n" + \
+                     Fore.LIGHTGREEN_EX + "tail [filename] " + Fore.LIGHTBLACK_EX + "{opt:rows}\n\n" + Fore.LIGHTBLUE_EX
+
         build_str += "PIN A CSV/TSV FILE AS DATAFRAME:\n"
         build_str += Fore.LIGHTGREEN_EX + "pin [name-to-store] [filename] " + Fore.LIGHTBLACK_EX + \
                      "{opt:delimeter}\n\n" + Fore.LIGHTBLUE_EX
 
+        build_str += "SAVE ALL PINNED DATAFRAMES AS A SESSION:\n"
+        build_str += Fore.LIGHTGREEN_EX + "save-session [name]\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "RESTORE A SAVED SESSION:\n"
+        build_str += Fore.LIGHTGREEN_EX + "load-session [name]\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "INDEX THE COLUMNS OF EVERY CSV/TSV UNDER BASE, ONLY CHANGED FILES ARE READ AGAIN:\n"
+        build_str += Fore.LIGHTGREEN_EX + "catalog scan\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "SEARCH THE CATALOG FOR COLUMNS:\n"
+        build_str += Fore.LIGHTGREEN_EX + "catalog search " + Fore.LIGHTBLACK_EX + \
+                     "{opt:col=name} {opt:dtype=int|float|str} {opt:file=*glob*}\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "VIEW OR CLEAR THE CACHE OF VIEW RESULTS:\n"
+        build_str += Fore.LIGHTGREEN_EX + "memo " + Fore.LIGHTBLACK_EX + "{opt:clear}\n\n" + Fore.LIGHTBLUE_EX
+
         build_str += "EXIT GNATSHELL:\n"
         build_str += Fore.LIGHTGREEN_EX + "exit\n\n" + Fore.LIGHTBLUE_EX
 
+        build_str += "RUN A COMMAND IN THE BACKGROUND:\n"
+        build_str += Fore.LIGHTGREEN_EX + "[command] &\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "LIST, WAIT FOR, OR STOP BACKGROUND JOBS:\n"
+        build_str += Fore.LIGHTGREEN_EX + "jobs\nfg [job-number]\nkill [job-number]\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "PAGE THROUGH THE OUTPUT OF A COMMAND:\n"
+        build_str += Fore.LIGHTGREEN_EX + "page [command]\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "TIME A COMMAND:\n"
+        build_str += Fore.LIGHTGREEN_EX + "time [command]\n\n" + Fore.LIGHTBLUE_EX
+
+        build_str += "PROFILE A COMMAND:\n"
+        build_str += Fore.LIGHTGREEN_EX + "prof " + Fore.LIGHTBLACK_EX + "{opt:-n functions} {opt:-o file.pstats} " + \
+                     Fore.LIGHTGREEN_EX + "[command]\n\n" + Fore.LIGHTBLUE_EX
+
         build_str += "VIEW PUBLIC IP:\n"
         build_str += Fore.LIGHTGREEN_EX + "ip\n\n" + Fore.LIGHTBLUE_EX
 
@@ -153,76 +255,116 @@ class MemoryBank:
         return build_str
 
 
-    def handle(self, command:list):
-        if command[0] in RESERVED:
-
-            if command[0] == "pwd":
-                print(self.pwd())
-
-            elif command[0] == "v" or command[0] == "view":
-                if len(command) < 2:
-                    print(self.view())
-                else:
-                    vars = None
-                    if len(command) > 2:
-                        vars = command[2:]
-                    print(self.view_subsection(command[1], vars=vars))
-
-            elif command[0] == "ls":
-                self.ls()
-
-            elif command[0] == "cd":
-                if len(command) < 2:
-                    print_err("ERROR: changing directory requires a path")
-                else:
-                    self.cd(command[1])
-
-            elif command[0] == "mkdir":
-                if len(command) < 2:
-                    print_err("ERROR: making a directory requires a directory name")
-                else:
-                    self.mkdir(command[1])
-
-            elif command[0] == "cls":
-                os.system('cls' if os.name == 'nt' else 'clear')
-
-            elif command[0] == "ip":
-                try:
-                    response = requests.get("https://api.ipify.org/?format=json")
-                    print(response.json()["ip"])
-                except:
-                    print_err("ERROR: Could not get public IP.")
-
-            elif command[0] == "help":
-                print(self.help())
-
-            elif command[0] == "pin":
-                if len(command) < 3:
-                    print_err("ERROR: pinning requires a name and a value")
-                else:
-                    var_name = command[1]
-                    var_value: str = command[2]
-
-                    if var_value.endswith(".csv") or var_value.endswith(".tsv"):
-                        try:
-                            new_var = None
-                            if len(command) > 3:
-                                new_var = Dataframe(csv_name=var_value, memory_bank=self, delimeter=command[3])
-                            else:
-                                new_var = Dataframe(csv_name=var_value, memory_bank=self)
-                            self.add_var(var_name, new_var)
-                            print(Fore.LIGHTGREEN_EX + "+ " + var_name + Fore.RESET)
-                        except:
-                            print_err("ERROR: could not read file: " + command[2])
+    def view_command(self, subsection=None, vars=None) -> str:
+        if subsection is None:
+            return self.view()
+        return self.view_subsection(subsection, vars=vars)
 
-        else:
-            if command[0] in self.variables.keys() and command[0] != "mem":
-                self.variables[command[0]].handle(command)
+
+    def cls(self):
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+
+    def ip(self) -> str:
+        try:
+            import requests
+            response = requests.get("https://api.ipify.org/?format=json")
+            return response.json()["ip"]
+        except:
+            print_err("ERROR: Could not get public IP.")
+
+
+    def pin(self, var_name: str, var_value: str, delimeter=None):
+        if var_value.endswith(".csv") or var_value.endswith(".tsv"):
+            try:
+                from dataframe_tool import Dataframe
+                new_var = Dataframe(csv_name=var_value, memory_bank=self, delimeter=delimeter)
+                self.add_var(var_name, new_var)
+                print(Fore.LIGHTGREEN_EX + "+ " + var_name + Fore.RESET)
+            except:
+                print_err("ERROR: could not read file: " + var_value)
 
 
+    def save_session(self, name: str):
+        import session
+        session.save_session(self, name)
 
 
+    def load_session(self, name: str):
+        import session
+        session.load_session(self, name)
 
 
+    def catalog(self, action=None, terms=None):
+        import catalog as dataset_catalog
+        if action == dataset_catalog.SCAN:
+            return dataset_catalog.scan(self)
+        if action == dataset_catalog.SEARCH:
+            return dataset_catalog.search(self, terms or [])
+        return dataset_catalog.summary(self)
 
 
+    def peek(self, file: str, n=None):
+        import peek
+        return peek.head(self, file, n)
+
+
+    def tail(self, file: str, n=None):
+        import peek
+        return peek.tail(self, file, n)
+
+
+    def memo(self, action=None) -> str:
+        if action == "clear":
+            memo.CACHE.clear()
+        return memo.CACHE.view()
+
+
+    def close(self):
+        """
+        Let every variable that holds files or decrypted values release them
+        """
+        with self.lock:
+            variables = list(self.variables.values())
+        for var in variables:
+            if var is not self and hasattr(var, "close"):
+                var.close()
+
+
+    def handle(self, command:list):
+        if command[0] in COMMANDS:
+            return COMMANDS.dispatch(self, command)
+
+        elif self.var_exists(command[0]) and command[0] != "mem":
+            return self.get_var(command[0]).handle(command)
+
+        else:
+            print_err("ERROR: unknown command: " + command[0])
+
+
+
+COMMANDS = CommandTable("memory bank", {
+    "pwd": Command("pwd"),
+    "v": Command("view_command", [Arg("subsection", optional=True), Arg("vars", rest=True)]),
+    "view": Command("view_command", [Arg("subsection", optional=True), Arg("vars", rest=True)]),
+    "ls": Command("ls"),
+    "cd": Command("cd", [Arg("path")], usage="ERROR: changing directory requires a path"),
+    "find": Command("find", [Arg("pattern"), Arg("options", rest=True)],
+                    usage="ERROR: find requires a glob or /regex/ pattern"),
+    "mkdir": Command("mkdir", [Arg("dir_name")], usage="ERROR: making a directory requires a directory name"),
+    "cls": Command("cls"),
+    "ip": Command("ip"),
+    "help": Command("help"),
+    "save-session": Command("save_session", [Arg("name")], usage="ERROR: saving a session requires a name"),
+    "load-session": Command("load_session", [Arg("name")], usage="ERROR: loading a session requires a name"),
+    "memo": Command("memo", [Arg("action", optional=True, choices=["clear"])]),
+    "peek": Command("peek", [Arg("file"), Arg("n", cast=int, optional=True, error="ERROR: {} is not a valid number of rows")],
+                    usage="ERROR: peek requires a file"),
+    "head": Command("peek", [Arg("file"), Arg("n", cast=int, optional=True, error="ERROR: {} is not a valid number of rows")],
+                    usage="ERROR: head requires a file"),
+    "tail": Command("tail", [Arg("file"), Arg("n", cast=int, optional=True, error="ERROR: {} is not a valid number of rows")],
+                    usage="ERROR: tail requires a file"),
+    "catalog": Command("catalog", [Arg("action", optional=True, choices=["scan", "search"]), Arg("terms", rest=True)]),
+    "pin": Command("pin", [Arg("var_name"), Arg("var_value"), Arg("delimeter", optional=True)],
+                   usage="ERROR: pinning requires a name and a value"),
+}, position=0)
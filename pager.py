@@ -0,0 +1,199 @@
+from colorama import Fore
+from typing import List, Optional
+import re
+import shutil
+import sys
+import shell_io
+from shell_io import print_err
+
+
+PAGE = "page"
+
+NEXT = ""
+NEXT_ALIAS = "n"
+BACK = "b"
+TOP = "g"
+END = "G"
+SEARCH = "/"
+QUIT = "q"
+
+# rows checked at a time when searching
+SEARCH_CHUNK = 500
+DEFAULT_HEIGHT = 24
+
+
+
+# ===========================================
+#                LINE SOURCES
+# ===========================================
+# A pager only asks its source for the lines on screen. Sources that know their
+# length and can format any range directly (like a dataframe column) give real
+# jump-to-row, anything else is an iterator that is read as far as needed.
+
+class LazyLines:
+    """
+    Wraps an iterator of lines, only pulling lines from it when they are asked for
+    """
+
+    def __init__(self, lines):
+        self.iterator = shell_io.as_lines(lines)
+        self.cache: List[str] = []
+        self.done = False
+
+
+    def fill(self, stop: Optional[int]):
+        while not self.done and (stop is None or len(self.cache) < stop):
+            try:
+                self.cache.append(next(self.iterator))
+            except StopIteration:
+                self.done = True
+
+
+    def known_length(self) -> Optional[int]:
+        return len(self.cache) if self.done else None
+
+
+    def get_lines(self, start: int, stop: int) -> List[str]:
+        self.fill(stop)
+        return self.cache[start:stop]
+
+
+    def length(self) -> int:
+        self.fill(None)
+        return len(self.cache)
+
+
+class SizedLines:
+    """
+    Adapts a source with __len__ and get_lines(start, stop)
+    """
+
+    def __init__(self, source):
+        self.source = source
+
+    def known_length(self) -> Optional[int]:
+        return len(self.source)
+
+    def get_lines(self, start: int, stop: int) -> List[str]:
+        return self.source.get_lines(start, min(stop, len(self.source)))
+
+    def length(self) -> int:
+        return len(self.source)
+
+
+def line_source(result):
+    if hasattr(result, "get_lines") and hasattr(result, "__len__"):
+        return SizedLines(result)
+    return LazyLines(result)
+
+
+
+# ===========================================
+#                   PAGER
+# ===========================================
+class Pager:
+    """
+    Interactive pager: enter/n next page, b back, g [row] jump to a row, G end,
+    /pattern search forward (/ alone repeats the last search), q quit
+    """
+
+    def __init__(self, result, height: Optional[int] = None):
+        self.source = line_source(result)
+        self.height = height if height is not None else max(shutil.get_terminal_size((80, DEFAULT_HEIGHT)).lines - 2, 1)
+        self.top = 0
+        self.last_search: Optional[re.Pattern] = None
+
+
+    def show(self):
+        for line in self.source.get_lines(self.top, self.top + self.height):
+            print(line + Fore.RESET)
+
+
+    def status(self) -> str:
+        length = self.source.known_length()
+        bottom = self.top + self.height
+        if length is not None:
+            bottom = min(bottom, length)
+        build_string = "rows " + str(self.top + 1) + "-" + str(bottom)
+        if length is not None:
+            build_string += " of " + str(length)
+        return Fore.LIGHTBLACK_EX + "[" + build_string + "] (enter, b, g [row], G, /search, q) " + Fore.RESET
+
+
+    def at_end(self) -> bool:
+        return len(self.source.get_lines(self.top + self.height, self.top + self.height + 1)) == 0
+
+
+    def jump(self, row: int):
+        self.top = max(row, 0)
+        length = self.source.known_length()
+        if length is not None and self.top >= length:
+            self.top = max(length - self.height, 0)
+
+
+    def search(self, pattern: Optional[str]):
+        if pattern is not None and len(pattern) > 0:
+            try:
+                self.last_search = re.compile(pattern)
+            except re.error:
+                print_err("ERROR: " + pattern + " is not a valid pattern")
+                return
+        if self.last_search is None:
+            print_err("ERROR: nothing to search for")
+            return
+
+        row = self.top + 1
+        while True:
+            lines = self.source.get_lines(row, row + SEARCH_CHUNK)
+            if len(lines) == 0:
+                print_err("ERROR: pattern not found")
+                return
+            for i, line in enumerate(lines):
+                if self.last_search.search(shell_io.strip_colors(line)) is not None:
+                    self.top = row + i
+                    return
+            row += len(lines)
+
+
+    def run(self):
+        self.show()
+        while not self.at_end() or self.top > 0:
+            action = input(self.status()).strip()
+
+            if action == QUIT:
+                return
+            elif action == NEXT or action == NEXT_ALIAS:
+                if self.at_end():
+                    return
+                self.top += self.height
+            elif action == BACK:
+                self.top = max(self.top - self.height, 0)
+            elif action == END:
+                self.jump(self.source.length() - self.height)
+            elif action.startswith(TOP):
+                try:
+                    row = int(action[len(TOP):].strip() or "1")
+                    self.jump(row - 1)
+                except ValueError:
+                    print_err("ERROR: " + action[len(TOP):].strip() + " is not a valid row")
+                    continue
+            elif action.startswith(SEARCH):
+                self.search(action[len(SEARCH):])
+            elif action.isdigit():
+                self.jump(int(action) - 1)
+            else:
+                print_err("ERROR: unknown pager command: " + action)
+                continue
+            self.show()
+
+
+def page(result):
+    """
+    Page through the result of a command, or stream it when there is no terminal to page on
+    """
+    if result is None:
+        return
+    if not sys.stdout.isatty() or not sys.stdin.isatty():
+        shell_io.write_output(result)
+        return
+    Pager(result).run()
@@ -1,5 +1,12 @@
-from data_files_util import Datafile
+from data_files_util import Datafile, VALUE_START, VALUE_DELIMETER
 from colorama import Fore
+from command_parser import CommandTable, Command, Arg
+from shell_io import print_err
+import csv
+import io
+import itertools
+import os
+import time
 
 FILENAME = "passwd.txt"
 KEY_FILE = "key.key"
@@ -8,10 +15,37 @@ VIEW = "v"
 ADD = "add"
 DELETE = "del"
 SAVE = "save"
+COMPACT = "compact"
+IMPORT = "import"
+EXPORT = "export"
+ROTATE_KEY = "rotate-key"
+FIND = "find"
 HELP = "help"
 
-def print_err(text):
-    print(Fore.RED + text)
+CSV_HEADER = ["name", "value", "info"]
+
+
+
+def valid_name(name: str) -> bool:
+    return len(name) > 0 and len(name.split()) == 1 and VALUE_DELIMETER not in name
+
+
+def valid_info(info: str) -> bool:
+    # info is written as a comment line, one that looks like a value would be read back as an entry
+    return not (info.startswith(VALUE_START) and VALUE_DELIMETER in info)
+
+
+def csv_lines(rows):
+    """
+    Format rows as csv, one line at a time
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()[:-1]
 
 
 
@@ -25,21 +59,98 @@ class PasswordManager:
         else:
             return self.pwd.view()
 
-    def add(self, command: list):
-        if len(command) < 4:
-            print_err("ERROR: invalid add, must have name and value")
-        else:
-            self.pwd.add(name=command[2], value=command[3], is_encrypted=True, tag="encrypted")
+    def add(self, name: str, value: str):
+        self.pwd.add(name=name, value=value, is_encrypted=True, tag="encrypted")
 
-    def delete(self, command: list):
-        if len(command) < 3:
-            print_err("ERROR: invalid delete, must have name")
-        else:
-            self.pwd.delete(command[2])
+    def delete(self, name: str):
+        self.pwd.delete(name)
 
     def save(self):
         self.pwd.save()
 
+    def compact(self):
+        self.pwd.compact()
+
+    def find(self, pattern: str):
+        return self.pwd.find(pattern)
+
+
+    def rotate_key(self):
+        start = time.perf_counter()
+        count = self.pwd.rotate_key()
+        if count is None:
+            return
+        seconds = time.perf_counter() - start
+        print(Fore.LIGHTGREEN_EX + "key rotated: " + str(count) + " passwords re-encrypted in " +
+              str(round(seconds, 3)) + " s (" + str(round(count / max(seconds, 1e-9))) + " passwords/s)" + Fore.RESET)
+
+
+    def import_csv(self, file: str):
+        """
+        Add every name,value[,info] row of a csv file, then save everything in one atomic rewrite
+        :param file: the csv to read, a first row of name,value is skipped
+        """
+        try:
+            csv_file = open(file, "r", newline="")
+        except OSError:
+            print_err("ERROR: could not open " + file)
+            return
+
+        skipped = []
+
+        def rows():
+            for i, row in enumerate(csv.reader(csv_file)):
+                if i == 0 and [cell.strip().lower() for cell in row[:2]] == CSV_HEADER[:2]:
+                    continue
+                if len(row) < 2 or not valid_name(row[0].strip()):
+                    skipped.append(i + 1)
+                    continue
+                info = " ".join(row[2].split()) if len(row) > 2 else ""
+                if not valid_info(info):
+                    skipped.append(i + 1)
+                    continue
+                yield row[0].strip(), row[1], info if len(info) > 0 else None
+
+        with csv_file:
+            count = self.pwd.add_many(rows(), is_encrypted=True, tag="encrypted")
+        if count is None:
+            return
+        if len(skipped) > 0:
+            print_err("ERROR: skipped " + str(len(skipped)) + " invalid rows, first at line " + str(skipped[0]))
+        print(Fore.LIGHTGREEN_EX + " + " + str(count) + " passwords imported" + Fore.RESET)
+        self.pwd.compact()
+
+
+    def export_csv(self, file: str = None):
+        """
+        Write every password as name,value,info
+        :param file: the csv to write, only readable by the owner. Without one the csv is the command output
+        """
+        rows = ([name, value, (info or "").strip()] for name, value, info in self.pwd.items())
+        if file is None:
+            return csv_lines(itertools.chain([CSV_HEADER], rows))
+
+        temp_path = file + ".tmp"
+        count = 0
+        try:
+            descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(descriptor, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file, lineterminator="\n")
+                writer.writerow(CSV_HEADER)
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            os.replace(temp_path, file)
+        except OSError as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            print_err("ERROR: could not export to " + file + ": " + str(e))
+            return
+        print(Fore.LIGHTGREEN_EX + str(count) + " passwords exported to " + file + Fore.RESET)
+
+    def close(self):
+        self.pwd.close()
+
     def type_string(self) -> str:
         return "password_manager"
 
@@ -51,28 +162,35 @@ class PasswordManager:
         build_str += "This tool allows you to store, view, and edit encrypted passwords.\n\n"
         build_str += "VIEW ALL PASSWORDS:\n" + Fore.LIGHTGREEN_EX + "passwd v" + Fore.LIGHTBLUE_EX + "\n\n"
         build_str += "VIEW A SPECIFIC PASSWORD:\n" + Fore.LIGHTGREEN_EX + "passwd v [name]" + Fore.LIGHTBLUE_EX + "\n\n"
+        build_str += "FIND PASSWORDS BY PART OF THEIR NAME OR INFO:\n" + Fore.LIGHTGREEN_EX + "passwd find [pattern]" + \
+                     Fore.LIGHTBLUE_EX + "\n\n"
         build_str += "ADD A PASSWORD:\n" + Fore.LIGHTGREEN_EX + "passwd add [name] [value]" + Fore.LIGHTBLUE_EX + "\n\n"
         build_str += "DELETE A PASSWORD:\n" + Fore.LIGHTGREEN_EX + "passwd del [name]" + Fore.LIGHTBLUE_EX + "\n\n"
         build_str += "SAVE ALL CHANGES:\n" + Fore.LIGHTGREEN_EX + "passwd save" + Fore.LIGHTBLUE_EX + "\n\n"
+        build_str += "ADD EVERY name,value[,info] ROW OF A CSV AND SAVE:\n" + Fore.LIGHTGREEN_EX + \
+                     "passwd import [file.csv]" + Fore.LIGHTBLUE_EX + "\n\n"
+        build_str += "EXPORT ALL PASSWORDS AS CSV, TO A FILE OR AS OUTPUT:\n" + Fore.LIGHTGREEN_EX + \
+                     "passwd export [file.csv (optional)]" + Fore.LIGHTBLUE_EX + "\n\n"
+        build_str += "RE-ENCRYPT EVERY PASSWORD UNDER A NEW KEY AND SAVE:\n" + Fore.LIGHTGREEN_EX + \
+                     "passwd rotate-key" + Fore.LIGHTBLUE_EX + "\n\n"
+        build_str += "REWRITE THE FILE WITH ALL SAVED CHANGES MERGED IN:\n" + Fore.LIGHTGREEN_EX + "passwd compact" + \
+                     Fore.LIGHTBLUE_EX + "\n\n"
         return build_str
 
     def handle(self, command:list):
-        if len(command) < 2:
-            return
-
-        if command[1] == VIEW and len(command) > 2:
-            print(self.view(vars=command[2:]))
-        elif command[1] == VIEW:
-            print(self.view())
-        elif command[1] == ADD:
-            self.add(command)
-        elif command[1] == DELETE:
-            self.delete(command)
-        elif command[1] == SAVE:
-            self.save()
-        elif command[1] == HELP:
-            print(self.help())
-        else:
-            print_err("ERROR: unknown password manager command: " + command[1])
-
-
+        return COMMANDS.dispatch(self, command)
+
+
+
+COMMANDS = CommandTable("password manager", {
+    VIEW: Command("view", [Arg("vars", rest=True)]),
+    ADD: Command("add", [Arg("name"), Arg("value")], usage="ERROR: invalid add, must have name and value"),
+    DELETE: Command("delete", [Arg("name")], usage="ERROR: invalid delete, must have name"),
+    SAVE: Command("save"),
+    COMPACT: Command("compact"),
+    IMPORT: Command("import_csv", [Arg("file")], usage="ERROR: invalid import, must have a csv file"),
+    EXPORT: Command("export_csv", [Arg("file", optional=True)]),
+    ROTATE_KEY: Command("rotate_key"),
+    FIND: Command("find", [Arg("pattern")], usage="ERROR: invalid find, must have a pattern"),
+    HELP: Command("help"),
+})
@@ -0,0 +1,126 @@
+from typing import List, Optional
+import csv
+import io
+import mmap
+import os
+from shell_io import print_err
+from table import Table, default_delimiter, sniff_delimiter
+
+
+PEEK = "peek"
+HEAD = "head"
+TAIL = "tail"
+
+DEFAULT_ROWS = 10
+# lines read from the top of a file to guess its delimiter
+SNIFF_LINES = 20
+
+
+
+def resolve(memory_bank, file: str) -> str:
+    base = memory_bank.variables["base"]
+    return base.cwd.replace("~", base.base) + "/" + file
+
+
+def read_header(data_file) -> List[bytes]:
+    """
+    The first lines of a file opened in binary mode, enough to read the header and sniff the delimiter
+    """
+    lines = []
+    for line in data_file:
+        lines.append(line)
+        if len(lines) >= SNIFF_LINES:
+            break
+    return lines
+
+
+def sniff(sample: List[bytes], path: str) -> str:
+    return sniff_delimiter(b"".join(sample).decode(errors="replace"), default_delimiter(path))
+
+
+def split_rows(lines: List[str], delimiter: str) -> List[List[str]]:
+    return list(csv.reader(io.StringIO("".join(lines)), delimiter=delimiter))
+
+
+def make_table(header: List[str], rows: List[List[str]]) -> Table:
+    width = max([len(header)] + [len(row) for row in rows])
+    header = header + [""] * (width - len(header))
+    return Table(header, [row + [""] * (width - len(row)) for row in rows], index=False)
+
+
+def head(memory_bank, file: str, n: Optional[int] = None):
+    """
+    Show the header and first n rows of a csv without loading the rest of it
+    """
+    n = n if n is not None else DEFAULT_ROWS
+    path = resolve(memory_bank, file)
+    try:
+        with open(path, "rb") as data_file:
+            sample = read_header(data_file)
+            delimiter = sniff(sample, path)
+
+            # the rows are read past the sample only as far as needed
+            data_file.seek(0)
+            text = io.TextIOWrapper(data_file, errors="replace", newline="")
+            rows = []
+            for row in csv.reader(text, delimiter=delimiter):
+                rows.append(row)
+                if len(rows) > n:
+                    break
+    except OSError:
+        print_err("ERROR: could not read file: " + file)
+        return None
+
+    if len(rows) == 0:
+        print_err("ERROR: " + file + " is empty")
+        return None
+    return make_table(rows[0], rows[1:])
+
+
+def last_lines(mapped, n: int, start: int) -> List[str]:
+    """
+    The last n lines of a memory-mapped file, found by searching backwards from the end
+    :param start: where the first line that may be returned starts, so the header is never included
+    """
+    end = len(mapped)
+    # a final newline does not start another line
+    if end > start and mapped[end - 1:end] == b"\n":
+        end -= 1
+    position = end
+    for _ in range(n):
+        newline = mapped.rfind(b"\n", start, position)
+        if newline < 0:
+            position = start - 1
+            break
+        position = newline
+    first = position + 1
+    return mapped[first:end].decode(errors="replace").splitlines(keepends=True)
+
+
+def tail(memory_bank, file: str, n: Optional[int] = None):
+    """
+    Show the header and last n rows of a csv, reading only the start and end of the file
+    Rows are split on line breaks, so quoted values that span lines can be cut
+    """
+    n = n if n is not None else DEFAULT_ROWS
+    path = resolve(memory_bank, file)
+    try:
+        with open(path, "rb") as data_file:
+            sample = read_header(data_file)
+            if len(sample) == 0:
+                print_err("ERROR: " + file + " is empty")
+                return None
+            delimiter = sniff(sample, path)
+            header_end = len(sample[0])
+
+            if os.fstat(data_file.fileno()).st_size <= header_end:
+                lines = []
+            else:
+                with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    lines = last_lines(mapped, n, header_end)
+    except OSError:
+        print_err("ERROR: could not read file: " + file)
+        return None
+
+    header = split_rows([sample[0].decode(errors="replace")], delimiter)
+    return make_table(header[0] if len(header) > 0 else [], split_rows(lines, delimiter))
@@ -0,0 +1,95 @@
+from collections import deque
+from typing import List, Iterable, Iterator
+import re
+from command_parser import Command, Arg
+from shell_io import print_err, strip_colors
+
+
+HEAD = "head"
+TAIL = "tail"
+GREP = "grep"
+COUNT = "count"
+
+INVERT_FLAG = "-v"
+IGNORE_CASE_FLAG = "-i"
+
+DEFAULT_LINES = 10
+
+# ===========================================
+#               PIPE FILTERS
+# ===========================================
+# Every filter takes an iterator of lines and returns a generator, so a
+# pipeline only formats as many lines as its last stage asks for.
+
+def head(lines: Iterator[str], n=None) -> Iterator[str]:
+    n = DEFAULT_LINES if n is None else n
+    if n <= 0:
+        return
+    for i, line in enumerate(lines, start=1):
+        yield line
+        if i >= n:
+            return
+
+
+def tail(lines: Iterator[str], n=None) -> Iterator[str]:
+    n = DEFAULT_LINES if n is None else n
+    yield from deque(lines, maxlen=max(n, 0))
+
+
+def grep(lines: Iterator[str], pattern: str, more=None) -> Iterator[str]:
+    # flags come before the pattern: grep -v -i pattern
+    tokens = [pattern] + (more if more is not None else [])
+    invert = False
+    flags = 0
+    while len(tokens) > 1 and tokens[0] in [INVERT_FLAG, IGNORE_CASE_FLAG]:
+        if tokens[0] == INVERT_FLAG:
+            invert = True
+        else:
+            flags |= re.IGNORECASE
+        tokens = tokens[1:]
+
+    try:
+        regex = re.compile(" ".join(tokens), flags)
+    except re.error:
+        print_err("ERROR: " + " ".join(tokens) + " is not a valid pattern")
+        return
+
+    for line in lines:
+        if (regex.search(strip_colors(line)) is not None) != invert:
+            yield line
+
+
+def count(lines: Iterator[str]) -> Iterator[str]:
+    total = 0
+    for _ in lines:
+        total += 1
+    yield str(total)
+
+
+# name -> (filter, argument schema)
+FILTERS = {
+    HEAD: (head, Command(HEAD, [Arg("n", cast=int, optional=True)])),
+    TAIL: (tail, Command(TAIL, [Arg("n", cast=int, optional=True)])),
+    GREP: (grep, Command(GREP, [Arg("pattern"), Arg("more", rest=True)])),
+    COUNT: (count, Command(COUNT)),
+}
+
+
+def run_filters(lines: Iterable[str], stages: List[List[str]]):
+    """
+    Chain the filters of a pipeline onto the output of its first command
+    :param lines: the lines produced by the first command
+    :param stages: the tokens of every stage after the first |
+    :return: a generator of the final lines, or None if a stage is invalid
+    """
+    for stage in stages:
+        if stage[0] not in FILTERS:
+            print_err("ERROR: " + stage[0] + " cannot be used after a pipe, try: " + ", ".join(FILTERS.keys()))
+            return None
+
+        function, schema = FILTERS[stage[0]]
+        kwargs = schema.parse(stage[0], stage[1:])
+        if kwargs is None:
+            return None
+        lines = function(lines, **kwargs)
+    return lines
@@ -0,0 +1,119 @@
+from colorama import Fore
+from typing import Callable, List, Optional
+import cProfile
+import io
+import pstats
+import sys
+import time
+from shell_io import print_err, format_bytes
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is then left out
+    resource = None
+
+
+TIME = "time"
+PROFILE = "prof"
+
+TOP_FLAG = "-n"
+OUTPUT_FLAG = "-o"
+DEFAULT_TOP = 20
+
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Peak resident set size of this process in bytes, None if it cannot be read
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, mac reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+
+# ===========================================
+#                    TIME
+# ===========================================
+
+def time_command(work: Callable):
+    """
+    Run a command and print its wall time, cpu time and how much the peak memory grew
+    :param work: runs the command
+    """
+    rss_before = peak_rss()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    try:
+        work()
+    finally:
+        wall = time.perf_counter() - wall_before
+        cpu = time.process_time() - cpu_before
+        rss_after = peak_rss()
+
+        build_string = Fore.LIGHTBLUE_EX + "WALL: " + str(round(wall, 4)) + " s\n"
+        build_string += "CPU: " + str(round(cpu, 4)) + " s\n"
+        if rss_before is None or rss_after is None:
+            build_string += "PEAK RSS DELTA: n/a"
+        else:
+            build_string += "PEAK RSS DELTA: " + format_bytes(rss_after - rss_before)
+        print(build_string + Fore.RESET)
+
+
+
+# ===========================================
+#                  PROFILE
+# ===========================================
+
+def parse_profile_options(command: List[str]):
+    """
+    Split the leading prof options from the profiled command
+    :param command: the tokens after prof
+    :return: (number of functions to show, pstats dump path, command tokens), or None if invalid
+    """
+    top = DEFAULT_TOP
+    dump = None
+    while len(command) > 0 and command[0] in [TOP_FLAG, OUTPUT_FLAG]:
+        if len(command) < 2:
+            print_err("ERROR: " + command[0] + " requires a value")
+            return None
+        if command[0] == TOP_FLAG:
+            try:
+                top = int(command[1])
+            except ValueError:
+                print_err("ERROR: " + command[1] + " is not a valid number of functions")
+                return None
+        else:
+            dump = command[1]
+        command = command[2:]
+    return top, dump, command
+
+
+def profile_command(work: Callable, top: int = DEFAULT_TOP, dump: Optional[str] = None):
+    """
+    Run a command under cProfile and print the functions with the most cumulative time
+    :param work: runs the command
+    :param top: how many functions to show
+    :param dump: optional path to write the raw pstats file to
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        work()
+    finally:
+        profile.disable()
+
+        stream = io.StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        print(Fore.LIGHTBLUE_EX + stream.getvalue().strip("\n") + Fore.RESET)
+
+        if dump is not None:
+            try:
+                stats.dump_stats(dump)
+                print(Fore.LIGHTGREEN_EX + "profile saved to " + dump + Fore.RESET)
+            except OSError:
+                print_err("ERROR: could not write profile to " + dump)
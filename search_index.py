@@ -0,0 +1,116 @@
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+
+
+# share of a pattern's trigrams a name or info must contain to count as a fuzzy match
+FUZZY_THRESHOLD = 0.5
+DEFAULT_LIMIT = 20
+
+
+
+def trigrams(text: str) -> Set[str]:
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+
+class SearchIndex:
+    """
+    Index over entry names and their info comments
+    Matches are ranked: exact name, name prefix, name substring, then info substring. Lower ranks are
+    only searched when the higher ones did not fill the limit. When nothing contains the pattern,
+    entries sharing most of its trigrams are returned as fuzzy matches.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Optional[str]]]):
+        """
+        :param entries: (name, info) pairs
+        """
+        self.names: List[str] = []
+        self.lower_names: List[str] = []
+        self.infos: List[str] = []
+        self.postings: Dict[str, Set[int]] = dict()
+
+        for name, info in entries:
+            position = len(self.names)
+            self.names.append(name)
+            self.lower_names.append(name.lower())
+            self.infos.append((info or "").lower())
+            for trigram in trigrams(self.lower_names[-1]) | trigrams(self.infos[-1]):
+                self.postings.setdefault(trigram, set()).add(position)
+
+        # names in sorted order for prefix lookups
+        self.sorted_positions = sorted(range(len(self.names)), key=lambda position: self.lower_names[position])
+        self.sorted_names = [self.lower_names[position] for position in self.sorted_positions]
+
+
+    def prefixed(self, pattern: str) -> List[int]:
+        start = bisect_left(self.sorted_names, pattern)
+        stop = bisect_left(self.sorted_names, pattern + "\uffff", lo=start)
+        return self.sorted_positions[start:stop]
+
+
+    def containing(self, pattern: str) -> Iterable[int]:
+        """
+        Entries that may contain pattern: those having all of its trigrams, or every entry for short patterns
+        """
+        pattern_trigrams = trigrams(pattern)
+        if len(pattern_trigrams) == 0:
+            return range(len(self.names))
+
+        postings = sorted((self.postings.get(trigram, set()) for trigram in pattern_trigrams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if len(candidates) == 0:
+                break
+        return sorted(candidates)
+
+
+    def fuzzy(self, pattern: str) -> List[int]:
+        pattern_trigrams = trigrams(pattern)
+        if len(pattern_trigrams) == 0:
+            return []
+        postings = sorted((self.postings.get(trigram, set()) for trigram in pattern_trigrams), key=len)
+        needed = math.ceil(FUZZY_THRESHOLD * len(postings))
+
+        # a match has at least one of the rarest len - needed + 1 trigrams, so only those postings are scanned
+        candidates = set().union(*postings[:len(postings) - needed + 1])
+        shared = Counter({position: sum(position in posting for posting in postings) for position in candidates})
+        return [position for position, count in shared.most_common() if count >= needed]
+
+
+    def search(self, pattern: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """
+        :return: the names best matching pattern, best first
+        """
+        pattern = pattern.lower()
+        found: List[int] = []
+        seen: Set[int] = set()
+
+        def add(positions: Iterable[int]) -> bool:
+            for position in positions:
+                if position not in seen:
+                    seen.add(position)
+                    found.append(position)
+                    if len(found) >= limit:
+                        return True
+            return False
+
+        # exact and prefix matches, shorter names are closer to what was typed
+        prefixed = self.prefixed(pattern)
+        if add(heapq.nsmallest(limit, prefixed, key=lambda position: len(self.names[position]))):
+            return [self.names[position] for position in found]
+
+        candidates = self.containing(pattern)
+        if add(position for position in candidates if pattern in self.lower_names[position]):
+            return [self.names[position] for position in found]
+        if add(position for position in candidates if pattern in self.infos[position]):
+            return [self.names[position] for position in found]
+
+        # fuzzy matches are only for patterns with a typo in them
+        if len(found) == 0:
+            add(self.fuzzy(pattern))
+        return [self.names[position] for position in found]
@@ -0,0 +1,166 @@
+from colorama import Fore
+from typing import Dict, Any
+import json
+import os
+import shutil
+from shell_io import print_err
+
+
+MANIFEST = "manifest.json"
+SESSION_VERSION = 1
+DEFAULT_SESSION_DIR = "sessions"
+
+# numpy kinds that can be stored raw and memory-mapped back: bool, ints, floats, complex, dates
+MAPPABLE_KINDS = "biufcmM"
+
+
+
+def session_dir(memory_bank) -> str:
+    directory = memory_bank.variables["settings"].get("session_dir")
+    return directory if directory is not None else DEFAULT_SESSION_DIR
+
+
+def session_path(memory_bank, name: str) -> str:
+    if name != os.path.basename(name) or name in ["", ".", ".."]:
+        raise ValueError(name + " is not a valid session name")
+    return os.path.join(session_dir(memory_bank), name)
+
+
+
+# ===========================================
+#                    SAVE
+# ===========================================
+
+def save_array(values, path: str) -> bool:
+    """
+    Write one column as a .npy file
+    :return: whether the column can be memory-mapped when it is loaded
+    """
+    import numpy as np
+
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in MAPPABLE_KINDS:
+        np.save(path, values, allow_pickle=False)
+        return True
+    np.save(path, values.astype(object), allow_pickle=True)
+    return False
+
+
+def save_dataframe(var, directory: str) -> Dict[str, Any]:
+    """
+    Store every column of a pinned Dataframe in its own .npy file
+    :return: the manifest entry for the variable
+    """
+    import pandas as pd
+
+    os.makedirs(directory)
+    entry = {"type": "dataframe", "source": var.source, "rows": len(var.df.index), "index": None, "columns": []}
+
+    if not isinstance(var.df.index, pd.RangeIndex) or var.df.index.start != 0 or var.df.index.step != 1:
+        mmap = save_array(var.df.index.to_numpy(), os.path.join(directory, "index.npy"))
+        entry["index"] = {"file": "index.npy", "name": var.df.index.name, "mmap": mmap}
+
+    for i, column in enumerate(var.df.columns):
+        filename = str(i) + ".npy"
+        mmap = save_array(var.df[column].to_numpy(), os.path.join(directory, filename))
+        entry["columns"].append({"name": str(column), "file": filename, "dtype": str(var.df[column].dtype),
+                                 "mmap": mmap})
+    return entry
+
+
+def save_session(memory_bank, name: str):
+    """
+    Write every pinned Dataframe to sessions/[name], replacing any older session of that name
+    The session is written to a temporary folder first so a failed save leaves the old one intact
+    """
+    from dataframe_tool import Dataframe
+
+    try:
+        final_path = session_path(memory_bank, name)
+    except ValueError as e:
+        print_err("ERROR: " + str(e))
+        return
+    temp_path = final_path + ".tmp"
+    if os.path.exists(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+
+    manifest = {"version": SESSION_VERSION, "variables": dict()}
+    with memory_bank.lock:
+        pinned = [(key, value) for key, value in memory_bank.variables.items() if isinstance(value, Dataframe)]
+
+    try:
+        for i, (key, var) in enumerate(pinned):
+            # folders are numbered so any variable name is safe on disk
+            manifest["variables"][key] = save_dataframe(var, os.path.join(temp_path, str(i)))
+            manifest["variables"][key]["dir"] = str(i)
+        with open(os.path.join(temp_path, MANIFEST), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+    except Exception as e:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        print_err("ERROR: could not save session " + name + ": " + str(e))
+        return
+
+    if os.path.exists(final_path):
+        shutil.rmtree(final_path)
+    os.replace(temp_path, final_path)
+    print(Fore.LIGHTGREEN_EX + "session " + name + " saved [" + str(len(pinned)) + " variables]" + Fore.RESET)
+
+
+
+# ===========================================
+#                    LOAD
+# ===========================================
+
+def load_array(directory: str, info: Dict[str, Any]):
+    import numpy as np
+
+    path = os.path.join(directory, info["file"])
+    if info["mmap"]:
+        return np.load(path, mmap_mode="r")
+    return np.load(path, allow_pickle=True)
+
+
+def load_dataframe(memory_bank, directory: str, entry: Dict[str, Any]):
+    """
+    Rebuild a Dataframe from its column files, numeric columns stay memory-mapped
+    """
+    import pandas as pd
+    from dataframe_tool import Dataframe
+
+    columns = dict()
+    for column in entry["columns"]:
+        columns[column["name"]] = load_array(directory, column)
+
+    index = None
+    if entry["index"] is not None:
+        index = pd.Index(load_array(directory, entry["index"]), name=entry["index"]["name"])
+
+    frame = pd.DataFrame(columns, index=index, copy=False)
+    return Dataframe(csv_name=entry["source"], memory_bank=memory_bank, frame=frame)
+
+
+def load_session(memory_bank, name: str):
+    """
+    Pin every variable stored in sessions/[name]
+    """
+    try:
+        path = session_path(memory_bank, name)
+        with open(os.path.join(path, MANIFEST), "r") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        print_err("ERROR: " + name + " is not a saved session")
+        return
+
+    if manifest.get("version") != SESSION_VERSION:
+        print_err("ERROR: session " + name + " was saved by an incompatible version")
+        return
+
+    for key, entry in manifest["variables"].items():
+        if memory_bank.var_exists(key):
+            print_err("ERROR: " + key + " is a taken or reserved variable name in memory")
+            continue
+        try:
+            memory_bank.add_var(key, load_dataframe(memory_bank, os.path.join(path, entry["dir"]), entry))
+            print(Fore.LIGHTGREEN_EX + "+ " + key + Fore.RESET)
+        except Exception as e:
+            print_err("ERROR: could not load " + key + " from session " + name + ": " + str(e))
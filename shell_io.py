@@ -0,0 +1,130 @@
+from colorama import Fore
+from contextlib import contextmanager
+import threading
+import sys
+import re
+
+
+# ===========================================
+#              SHELL OUTPUT
+# ===========================================
+# Every tool reports errors through print_err, so counting them here lets
+# non-interactive sessions tell whether a command failed. Counts are kept
+# per thread so background jobs do not fail the foreground command.
+
+_local = threading.local()
+
+
+def print_err(text):
+    _local.error_count = get_error_count() + 1
+    print(Fore.RED + text + Fore.RESET)
+
+
+def get_error_count() -> int:
+    return getattr(_local, "error_count", 0)
+
+
+def format_bytes(num_bytes: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(num_bytes) < 1024 or unit == "GB":
+            return str(round(num_bytes, 1)) + " " + unit
+        num_bytes /= 1024
+
+
+
+# ===========================================
+#             OUTPUT REDIRECTION
+# ===========================================
+# Tools print directly, so to give a worker thread its own output sys.stdout is
+# replaced by a router that sends each thread's writes to that thread's target.
+
+class OutputCancelled(Exception):
+    """
+    Raised inside a thread whose output has been cancelled
+    """
+    pass
+
+
+class OutputRouter:
+    def __init__(self, default):
+        self.default = default
+
+    def target(self):
+        return getattr(_local, "output", None) or self.default
+
+    def write(self, text):
+        if getattr(_local, "cancelled", None) is not None and _local.cancelled.is_set():
+            raise OutputCancelled()
+        return self.target().write(text)
+
+    def flush(self):
+        return self.target().flush()
+
+    def isatty(self) -> bool:
+        target = self.target()
+        return target.isatty() if hasattr(target, "isatty") else False
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+
+def install_output_router():
+    """
+    Route sys.stdout through an OutputRouter, safe to call more than once
+    """
+    if not isinstance(sys.stdout, OutputRouter):
+        sys.stdout = OutputRouter(sys.stdout)
+
+
+@contextmanager
+def redirect_thread_output(target, cancelled: threading.Event = None):
+    """
+    Send everything the current thread prints to target
+    :param target: any object with write and flush
+    :param cancelled: once set, the next write in this thread raises OutputCancelled
+    """
+    install_output_router()
+    previous = getattr(_local, "output", None)
+    previous_cancelled = getattr(_local, "cancelled", None)
+    _local.output = target
+    _local.cancelled = cancelled
+    try:
+        yield target
+    finally:
+        _local.output = previous
+        _local.cancelled = previous_cancelled
+
+
+# matches the color codes colorama writes so text can be searched without them
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def strip_colors(line: str) -> str:
+    return ANSI_ESCAPE.sub("", line)
+
+
+def as_lines(result):
+    """
+    Turn the result of a command into an iterator of lines
+    :param result: None, a string, or any iterable of lines (usually a generator)
+    """
+    if result is None:
+        return iter(())
+    if isinstance(result, str):
+        return iter(result.split("\n"))
+    if hasattr(result, "__iter__"):
+        return (str(line) for line in result)
+    return iter([str(result)])
+
+
+def write_output(result):
+    """
+    Print the result of a command, streaming it line by line if it is a generator
+    """
+    if result is None:
+        return
+    if isinstance(result, str):
+        print(result)
+        return
+    for line in as_lines(result):
+        print(line)
@@ -0,0 +1,124 @@
+from typing import List, Sequence
+import csv
+from shell_io import strip_colors
+
+
+# box drawing characters, the same grid tabulate draws with tablefmt="fancy_grid"
+TOP = ("╒", "═", "╤", "╕")
+HEADER_RULE = ("╞", "═", "╪", "╡")
+ROW_RULE = ("├", "─", "┼", "┤")
+BOTTOM = ("╘", "═", "╧", "╛")
+WALL = "│"
+PADDING = 1
+
+# delimiters tried when guessing how a csv/tsv is split
+SNIFF_DELIMITERS = ",\t;|"
+
+
+
+def default_delimiter(path: str) -> str:
+    return "\t" if path.endswith(".tsv") else ","
+
+
+def sniff_delimiter(sample: str, default: str) -> str:
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        return default
+
+
+def is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+
+class Table:
+    """
+    A box drawn table that formats its lines on demand
+    Cells are turned into strings and measured once when the table is built. The lines themselves
+    are only drawn as they are read, so a long table streams and the pager can jump into the middle.
+    """
+
+    def __init__(self, headers: Sequence[str], rows: Sequence[Sequence], index: bool = True):
+        """
+        :param headers: the column names
+        :param rows: the cells of each row
+        :param index: whether to number the rows in a first column
+        """
+        self.headers = ([""] if index else []) + [str(header) for header in headers]
+        self.rows: List[List[str]] = []
+        for i, row in enumerate(rows):
+            self.rows.append(([str(i)] if index else []) + [str(cell) for cell in row])
+
+        # measured without color codes, which take no space on screen
+        self.widths = [len(strip_colors(header)) for header in self.headers]
+        self.cell_widths: List[List[int]] = []
+        for row in self.rows:
+            widths = [len(strip_colors(cell)) for cell in row]
+            self.cell_widths.append(widths)
+            self.widths = [max(width, cell_width) for width, cell_width in zip(self.widths, widths)]
+
+        # numeric columns are right aligned
+        self.right = [len(self.rows) > 0 and all(is_number(strip_colors(row[column])) for row in self.rows)
+                      for column in range(len(self.headers))]
+
+
+    @staticmethod
+    def from_columns(columns: dict, index: bool = True) -> "Table":
+        """
+        :param columns: column name -> list of cells
+        """
+        return Table(list(columns.keys()), list(zip(*columns.values())), index=index)
+
+
+    def rule(self, parts) -> str:
+        left, line, cross, right = parts
+        return left + cross.join(line * (width + 2 * PADDING) for width in self.widths) + right
+
+
+    def format_row(self, cells: List[str], cell_widths: List[int]) -> str:
+        build_string = WALL
+        for cell, cell_width, width, right in zip(cells, cell_widths, self.widths, self.right):
+            fill = " " * (width - cell_width)
+            build_string += " " * PADDING + (fill + cell if right else cell + fill) + " " * PADDING + WALL
+        return build_string
+
+
+    def __len__(self) -> int:
+        # top, header, header rule, then each row followed by a rule or the bottom
+        if len(self.rows) == 0:
+            return 3
+        return 3 + 2 * len(self.rows)
+
+
+    def line(self, number: int) -> str:
+        if number == 0:
+            return self.rule(TOP)
+        if number == 1:
+            return self.format_row(self.headers, [len(strip_colors(header)) for header in self.headers])
+        if number == len(self) - 1:
+            return self.rule(BOTTOM)
+        if number == 2:
+            return self.rule(HEADER_RULE)
+
+        row, is_rule = divmod(number - 3, 2)
+        if is_rule:
+            return self.rule(ROW_RULE)
+        return self.format_row(self.rows[row], self.cell_widths[row])
+
+
+    def get_lines(self, start: int, stop: int) -> List[str]:
+        return [self.line(number) for number in range(max(start, 0), min(stop, len(self)))]
+
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self.line(number)
+
+
+    def __str__(self) -> str:
+        return "\n".join(self)
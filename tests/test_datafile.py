@@ -0,0 +1,83 @@
+import pickle
+from cryptography.fernet import Fernet
+from data_files_util import Datafile
+
+
+def make_datafile(tmp_path):
+    path = tmp_path / "passwd.txt"
+    path.write_text("")
+    key_path = tmp_path / "key.key"
+    with open(key_path, "wb") as keyfile:
+        pickle.dump(Fernet(Fernet.generate_key()), keyfile)
+    return str(path), str(key_path)
+
+
+def test_add_after_another_process_rotates_key(tmp_path):
+    path, key_path = make_datafile(tmp_path)
+    first = Datafile(path, key_path)
+    second = Datafile(path, key_path)
+    first.add("early", "one", is_encrypted=True, tag="encrypted")
+    first.save()
+
+    first.rotate_key()
+    second.add("late", "two", is_encrypted=True, tag="encrypted")
+    second.save()
+
+    assert second.get("late") == "two"
+    assert Datafile(path, key_path).get("late") == "two"
+    assert Datafile(path, key_path).get("early") == "one"
+
+
+def test_value_under_another_key_is_reported(tmp_path):
+    path, key_path = make_datafile(tmp_path)
+    first = Datafile(path, key_path)
+    first.add("secret", "one", is_encrypted=True, tag="encrypted")
+    first.save()
+
+    with open(key_path, "wb") as keyfile:
+        pickle.dump(Fernet(Fernet.generate_key()), keyfile)
+    second = Datafile(path, key_path)
+
+    assert second.get("secret") is None
+    assert "secret" in str(second.view())
+
+
+def test_save_after_torn_journal_record(tmp_path):
+    path, key_path = make_datafile(tmp_path)
+    with open(path + ".journal", "w") as journal:
+        journal.write('{"op": "add", "name": "a", "value": "1"}\n{"op": "add", "name": "torn", "val')
+    datafile = Datafile(path, key_path)
+    datafile.add("b", "2")
+    datafile.save()
+
+    reloaded = Datafile(path, key_path)
+    assert reloaded.get("a") == "1"
+    assert reloaded.get("b") == "2"
+    assert reloaded.get("torn") is None
+
+
+def test_bad_sidecars_keep_their_pointers(tmp_path):
+    path, key_path = make_datafile(tmp_path)
+    with open(path, "w") as datafile:
+        datafile.write("> [array[float]] torn:: @torn.bin\n\n> [array[float]] missing:: @missing.bin\n\n")
+    (tmp_path / "torn.bin").write_bytes(b"\0" * 5)
+
+    datafile = Datafile(path, key_path)
+    assert datafile.get("torn") is None
+    assert datafile.get("missing") is None
+    datafile.compact()
+
+    text = open(path).read()
+    assert "torn:: @torn.bin" in text
+    assert "missing:: @missing.bin" in text
+
+
+def test_encrypted_add_without_key_is_rejected(tmp_path):
+    path, _ = make_datafile(tmp_path)
+    datafile = Datafile(path, str(tmp_path / "missing.key"))
+    datafile.add("bank", "hunter2", is_encrypted=True, tag="encrypted")
+    datafile.save()
+    datafile.compact()
+
+    assert datafile.get("bank") is None
+    assert "hunter2" not in open(path).read()
@@ -0,0 +1,29 @@
+from test_datafile import make_datafile
+from data_files_util import Datafile
+from password_manager import PasswordManager
+
+
+def test_import_skips_info_that_reads_as_an_entry(tmp_path):
+    path, key_path = make_datafile(tmp_path)
+    csv_path = tmp_path / "import.csv"
+    csv_path.write_text("name,value,info\nreal,secret,> x:: y\nother,two,fine info\n")
+
+    manager = PasswordManager(path, key_path)
+    manager.import_csv(str(csv_path))
+
+    reloaded = Datafile(path, key_path)
+    assert reloaded.get("x") is None
+    assert reloaded.get("real") is None
+    assert reloaded.get("other") == "two"
+
+
+def test_import_without_key_adds_nothing(tmp_path):
+    path, _ = make_datafile(tmp_path)
+    csv_path = tmp_path / "import.csv"
+    csv_path.write_text("name,value\nbank,hunter2\n")
+
+    manager = PasswordManager(path, str(tmp_path / "missing.key"))
+    manager.import_csv(str(csv_path))
+
+    assert "bank" not in manager.pwd.values
+    assert "hunter2" not in open(path).read()
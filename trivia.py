@@ -3,6 +3,8 @@ from typing import List, Optional
 import random
 import html
 from colorama import Fore
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
 
 DIFFICULTIES = [
     "easy",
@@ -44,8 +46,13 @@ GET = "get"
 HELP = "help"
 
 
-def print_err(text):
-    print(Fore.RED + text)
+
+# amount of questions that can be requested at once
+def question_amount(token: str) -> int:
+    num = int(token)
+    if num <= 0 or num >= 51:
+        raise ValueError(token)
+    return num
 
 
 def get_trivia(amount, difficulty, category=None):
@@ -134,42 +141,23 @@ class Trivia:
         return buildstring
 
 
-    def handle(self, command:list):
-        if len(command) < 2:
-            return
-
-        if command[1] == VIEW and len(command) > 2:
-            print(self.view(vars=command[2:]))
-
-        elif command[1] == VIEW:
-            print(self.view())
-
-        elif command[1] == HELP:
-            print(self.help())
-
-        elif command[1] == GET:
-            if len(command) < 5:
-                print_err("ERROR: get command requires a category, # of questions, and difficulty")
-                return
-            if command[2] not in CATEGORIES.keys():
-                print_err("ERROR: " + command[2] + " is not a valid category")
-                return
-            if command[4] not in DIFFICULTIES:
-                print_err("ERROR: " + command[4] + " is not a valid difficulty (easy, medium, hard)")
-                return
-            try:
-                num = int(command[3])
-                if num <= 0 or num >= 51:
-                    print_err("ERROR: amount must be an integer from 1 to 50.")
-                    return
-            except:
-                print_err("ERROR: amount must be an integer from 1 to 50.")
-                return
-
-            self.run_trivia(amount=command[3], difficulty=command[4], category=command[2])
+    def get_command(self, category: str, amount: int, difficulty: str):
+        self.run_trivia(amount=str(amount), difficulty=difficulty, category=category)
 
-        else:
-            print_err("ERROR: unknown trivia command: " + command[1])
+
+    def handle(self, command:list):
+        return COMMANDS.dispatch(self, command)
 
 
 
+COMMANDS = CommandTable("trivia", {
+    VIEW: Command("view", [Arg("vars", rest=True)]),
+    HELP: Command("help"),
+    GET: Command("get_command", [Arg("category", choices=list(CATEGORIES.keys()),
+                                     error="ERROR: {} is not a valid category"),
+                                 Arg("amount", cast=question_amount,
+                                     error="ERROR: amount must be an integer from 1 to 50."),
+                                 Arg("difficulty", choices=DIFFICULTIES,
+                                     error="ERROR: {} is not a valid difficulty (easy, medium, hard)")],
+                 usage="ERROR: get command requires a category, # of questions, and difficulty"),
+})
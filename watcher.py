@@ -0,0 +1,71 @@
+from colorama import Fore
+from typing import Callable, List, Optional
+import threading
+from shell_io import print_err
+
+
+DEFAULT_INTERVAL = 2.0
+
+
+
+class FileWatcher:
+    """
+    Polls the modification time of watched Datafiles on a background thread.
+    A Datafile that changed on disk is reloaded and its listeners are told which entries changed.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.watched = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+
+    def watch(self, datafile, listener: Optional[Callable[[List[str]], None]] = None):
+        """
+        :param datafile: the Datafile to keep up to date
+        :param listener: called with the names of the changed entries after each reload
+        """
+        with self.lock:
+            self.watched.append((datafile, listener))
+
+
+    def check(self):
+        """
+        Reload every watched file that changed since it was last loaded or saved
+        """
+        with self.lock:
+            watched = list(self.watched)
+
+        for datafile, listener in watched:
+            if not datafile.changed_on_disk():
+                continue
+            try:
+                changed = datafile.reload()
+            except Exception as e:
+                # the file may be half written, try again next poll
+                print_err("ERROR: could not reload " + datafile.filepath + ": " + str(e))
+                continue
+            if len(changed) > 0:
+                print(Fore.LIGHTBLACK_EX + datafile.filepath + " reloaded: " + ", ".join(changed) + Fore.RESET)
+                if listener is not None:
+                    listener(changed)
+
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+
+    def start(self):
+        if self.thread is None and self.interval > 0:
+            self.thread = threading.Thread(target=self.run, name="file-watcher", daemon=True)
+            self.thread.start()
+
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -2,6 +2,8 @@ import requests
 from colorama import Fore
 import json
 from bs4 import BeautifulSoup
+from shell_io import print_err
+from command_parser import CommandTable, Command, Arg
 
 WIKI_URL = "https://en.wikipedia.org/api/rest_v1/page/mobile-sections/"
 RAND_URL = "https://en.wikipedia.org/w/api.php?action=query&list=random&format=json&rnnamespace=0&rnlimit=1"
@@ -13,9 +15,6 @@ HELP = "help"
 
 
 
-def print_err(text):
-    print(Fore.RED + text + Fore.RESET)
-
 
 
 class Wikipedia:
@@ -103,31 +102,13 @@ class Wikipedia:
 
 
     def handle(self, command:list):
-        if len(command) < 2:
-            return
-
-        if command[1] == VIEW and len(command) > 2:
-            print(self.view(vars=command[2:]))
-
-        elif command[1] == VIEW:
-            print(self.view())
-
-        elif command[1] == SUMMARY:
-            if len(command) < 3:
-                print_err("ERROR: summary command requires a title to search by")
-            else:
-                print(self.get_summary(command[2]))
-
-        elif command[1] == FULL:
-            if len(command) < 3:
-                print_err("ERROR: full command requires a title to search by")
-            else:
-                print(self.get_full_article(command[2]))
-
-        elif command[1] == HELP:
-            print(self.help())
-
-
+        return COMMANDS.dispatch(self, command)
 
 
 
+COMMANDS = CommandTable("wikipedia", {
+    VIEW: Command("view", [Arg("vars", rest=True)]),
+    SUMMARY: Command("get_summary", [Arg("title")], usage="ERROR: summary command requires a title to search by"),
+    FULL: Command("get_full_article", [Arg("title")], usage="ERROR: full command requires a title to search by"),
+    HELP: Command("help"),
+})